@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import signal
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing.managers import SyncManager
+
+import manifest
+import renderer
+from metrics import Metrics, write_record
+
+DONE = 'done'
+FAILED = 'failed'
+INVALID = 'invalid'
+CANCELLED = 'cancelled'
+SKIPPED = 'skipped'
+
+RoadResult = namedtuple('RoadResult', ['road', 'status', 'error', 'inputs', 'metrics'], defaults=[None, None])
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def list_roads(src_dir):
+    roads = []
+    for basename in os.listdir(src_dir):
+        full_path = os.path.join(src_dir, basename)
+        if os.path.isdir(full_path):
+            roads.append(full_path)
+    return roads
+
+
+def render_road(src_dir, output_dir, options, log=print, progress=None, cancel=None,
+                incremental=False, entry=None, scan=None):
+    """Render a single road folder and return its :class:`RoadResult`.
+
+    ``progress(basename, value, maximum)`` reports the pages of this road.
+    With ``incremental``, the road is skipped when its manifest ``entry``
+    shows that the PDF was already built from the same photos and settings.
+    ``scan`` returns the photo records of the road when it was already
+    scanned ahead, see :func:`prefetch_scans`. Rendered roads carry their
+    :meth:`metrics.Metrics.record` in ``RoadResult.metrics``.
+    """
+    basename = os.path.basename(src_dir)
+    if cancel is not None and cancel.is_set():
+        return RoadResult(basename, CANCELLED, None)
+
+    def road_progress(value, maximum):
+        if progress is not None:
+            progress(basename, value, maximum)
+
+    log('# Current directory: ' + basename)
+    pictures = None
+    inputs = None
+    metrics = Metrics()
+    try:
+        if renderer.parse_road(src_dir) is not None:
+            with metrics.stage('scan'):
+                pictures = scan() if scan is not None else renderer.find_pictures(src_dir, options.get('catalog'))
+            inputs = manifest.road_inputs(src_dir, pictures, options)
+            output = renderer.get_output_path(src_dir, output_dir)
+            if incremental and manifest.is_up_to_date(entry, inputs, output):
+                log('# Unchanged, skipped')
+                log('==========\n')
+                return RoadResult(basename, SKIPPED, None, inputs)
+        err = renderer.insert_picture(src_dir, output_dir, options, log, road_progress, cancel, pictures, metrics)
+    except renderer.Cancelled:
+        log('# Cancelled')
+        result = RoadResult(basename, CANCELLED, None)
+    except Exception as e:
+        log('# Error: ' + str(e))
+        result = RoadResult(basename, FAILED, str(e))
+    else:
+        if err is None:
+            result = RoadResult(basename, INVALID, None)
+        elif err:
+            result = RoadResult(basename, FAILED, 'xhtml2pdf reported {} error(s)'.format(err))
+        else:
+            result = RoadResult(basename, DONE, None, inputs,
+                                metrics.record(road=basename, engine=options.get('engine', renderer.ENGINE_HTML)))
+    log('==========\n')
+    return result
+
+
+def prefetch_scans(roads, catalog_file=None):
+    """Yield ``(road, scan)`` for every road while the next road is scanned
+    in a background thread. ``scan()`` returns the photo records of the road
+    or raises the error of the scan. With ``catalog_file``, the roads are
+    scanned through the photo catalog.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        def submit(road):
+            if renderer.parse_road(road) is None:
+                return None
+            return executor.submit(renderer.find_pictures, road, catalog_file)
+
+        future = submit(roads[0]) if roads else None
+        for road_idx, road in enumerate(roads):
+            current = future
+            if road_idx + 1 < len(roads):
+                future = submit(roads[road_idx + 1])
+            yield road, current.result if current is not None else None
+
+
+def _init_worker():
+    # Ctrl+C reaches the whole process group, let the parent cancel the batch
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _render_road_worker(src_dir, output_dir, options, event_queue, cancel, incremental, entry):
+    prefix = '[{}] '.format(os.path.basename(src_dir))
+
+    def log(message):
+        event_queue.put(('log', prefix + message))
+
+    def progress(basename, value, maximum):
+        event_queue.put(('progress', basename, value, maximum))
+
+    return render_road(src_dir, output_dir, options, log, progress, cancel, incremental, entry)
+
+
+def _drain(event_queue, log, progress):
+    while True:
+        try:
+            event = event_queue.get_nowait()
+        except queue.Empty:
+            return
+        if event[0] == 'log':
+            log(event[1])
+        elif progress is not None:
+            progress(*event[1:])
+
+
+def run_batch(src_dir, output_dir, options, workers=1, log=print,
+              progress=None, overall_progress=None, cancel=None, incremental=False,
+              metrics_file=None, roads=None, resume=False):
+    """Render every road folder in ``src_dir``, or only the folder names in ``roads``.
+
+    With ``workers`` greater than one, each road is rendered in its own worker
+    process and log messages are streamed back through ``log`` as they arrive.
+    ``progress(basename, value, maximum)`` reports the pages of the road being
+    rendered and ``overall_progress(value, maximum)`` the finished roads.
+    Setting ``cancel`` (a :class:`threading.Event`) stops the batch before the
+    next page or road. Every rendered road is recorded in the build manifest of
+    ``output_dir``; with ``incremental``, roads whose photos and settings have
+    not changed since are skipped. When rendering sequentially, the photos of
+    the next road are scanned in the background while the current road
+    renders. The metrics of every rendered road are appended to the JSON
+    lines file ``metrics_file``. Returns a list of :class:`RoadResult`.
+
+    The finished roads are recorded in the journal of ``output_dir`` until
+    the batch ends without being cancelled. With ``resume``, the roads of an
+    interrupted batch that were not finished are rendered instead.
+    """
+    if roads is None:
+        roads = [os.path.basename(road) for road in list_roads(src_dir)]
+    finished = []
+    journal = manifest.load_journal(output_dir) if resume else None
+    if journal is not None and journal['source'] == os.path.abspath(src_dir):
+        roads = journal['roads']
+        finished = journal['finished']
+        log('# Resuming, {} of {} road(s) already finished'.format(len(finished), len(roads)))
+    elif resume:
+        log('# No interrupted batch to resume, rendering every road')
+    manifest.save_journal(output_dir, os.path.abspath(src_dir), roads, finished)
+    journal_roads = roads
+    roads = [os.path.join(src_dir, road) for road in roads if road not in finished]
+    entries = manifest.load_manifest(output_dir)
+    results = []
+
+    def road_finished(result):
+        results.append(result)
+        if result.status in (DONE, SKIPPED, INVALID):
+            finished.append(result.road)
+            manifest.save_journal(output_dir, os.path.abspath(src_dir), journal_roads, finished)
+        if result.status == DONE:
+            output = renderer.get_output_path(os.path.join(src_dir, result.road), output_dir)
+            entries[result.road] = manifest.make_entry(result.inputs, output)
+            manifest.save_manifest(output_dir, entries)
+            if metrics_file:
+                write_record(metrics_file, result.metrics)
+        if overall_progress is not None:
+            overall_progress(len(results), len(roads))
+
+    def batch_finished():
+        if not any(result.status == CANCELLED for result in results):
+            manifest.clear_journal(output_dir)
+        return results
+
+    if overall_progress is not None:
+        overall_progress(0, len(roads))
+
+    if workers <= 1 or len(roads) <= 1:
+        for road, scan in prefetch_scans(roads, options.get('catalog')):
+            entry = entries.get(os.path.basename(road))
+            road_finished(render_road(road, output_dir, options, log, progress, cancel,
+                                      incremental, entry, scan))
+        return batch_finished()
+
+    manager = SyncManager()
+    manager.start(_init_worker)
+    with manager:
+        event_queue = manager.Queue()
+        worker_cancel = manager.Event()
+        with ProcessPoolExecutor(max_workers=min(workers, len(roads)),
+                                 initializer=_init_worker) as executor:
+            futures = {}
+            for road in roads:
+                entry = entries.get(os.path.basename(road))
+                future = executor.submit(_render_road_worker, road, output_dir, options,
+                                         event_queue, worker_cancel, incremental, entry)
+                futures[future] = road
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                _drain(event_queue, log, progress)
+                if cancel is not None and cancel.is_set() and not worker_cancel.is_set():
+                    worker_cancel.set()
+                    for future in pending:
+                        future.cancel()
+                for future in done:
+                    basename = os.path.basename(futures[future])
+                    if future.cancelled():
+                        road_finished(RoadResult(basename, CANCELLED, None))
+                        continue
+                    try:
+                        road_finished(future.result())
+                    except Exception as e:
+                        log('[{}] # Error: {}'.format(basename, e))
+                        road_finished(RoadResult(basename, FAILED, str(e)))
+        _drain(event_queue, log, progress)
+    return batch_finished()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Time the stages of the pipeline on a synthetic or real survey tree.
+
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --baseline results.json
+
+Without ``--source`` a synthetic tree is generated: ``NNN - NAME`` road
+folders with ``KIRI``/``KANAN`` subfolders and noisy ``STA x+yyy`` photos,
+which compress like real ones. The scan, prepare, build, render and write
+stages are timed separately and the best time of ``--repeat`` runs is kept.
+With ``--baseline``, stages that got slower than the tolerance are reported
+and the exit status is 1.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+import pisasession
+import renderer
+
+RESULT_VERSION = 1
+STAGES = ('scan', 'prepare', 'build', 'render', 'write')
+
+# The second and third names wrap in the photo captions, over two and three lines
+ROAD_NAMES = ('JALAN SUDIRMAN', 'JALAN GATOT SUBROTO', 'JALAN LINGKAR BARAT SULTAN THAHA SAIFUDDIN',
+              'JALAN HAYAM WURUK', 'JALAN KAPTEN PATTIMURA', 'JALAN PANGERAN DIPONEGORO', 'JALAN SULTAN AGUNG',
+              'JALAN IMAM BONJOL', 'JALAN SISINGAMANGARAJA')
+
+
+def make_photo(filename, size, rng):
+    """Write a photo of smoothed noise, which compresses about as well as a real one."""
+    noise_size = (max(size[0] // 4, 1), max(size[1] // 4, 1))
+    image = Image.merge('RGB', [Image.effect_noise(noise_size, rng.randint(40, 80)) for _ in range(3)])
+    image = image.resize(size, Image.BICUBIC)
+    if filename.lower().endswith('.png'):
+        image.save(filename)
+    else:
+        image.save(filename, quality=85)
+
+
+def generate_survey(dest, roads=3, photos=60, size=(1600, 1200), png_ratio=0.1, seed=0):
+    """Generate a source tree of ``roads`` road folders with ``photos`` photos each.
+
+    Photos are spread over the road folder and its ``KIRI`` and ``KANAN``
+    subfolders, with the station increasing along the road.
+    """
+    rng = random.Random(seed)
+    for road_idx in range(roads):
+        name = '{:03} - {}'.format(road_idx + 1, ROAD_NAMES[road_idx % len(ROAD_NAMES)])
+        road_dir = os.path.join(dest, name)
+        for subdir in ('', 'KIRI', 'KANAN'):
+            os.makedirs(os.path.join(road_dir, subdir), exist_ok=True)
+        station = 0
+        for _ in range(photos):
+            station += rng.randint(20, 250)
+            subdir = rng.choice(('', 'KIRI', 'KANAN'))
+            ext = '.png' if rng.random() < png_ratio else rng.choice(('.jpg', '.jpg', '.jpeg', '.JPG'))
+            basename = 'STA {}+{:03}{}'.format(station // 1000, station % 1000, ext)
+            make_photo(os.path.join(road_dir, subdir, basename), size, rng)
+
+
+def time_road(src_dir, output_dir, options, timings):
+    """Render one road, adding the time of every stage to ``timings``."""
+    no_ruas, nm_ruas = renderer.parse_road(src_dir)
+
+    start = time.perf_counter()
+    pictures = renderer.find_pictures(src_dir)
+    timings['scan'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    sources = renderer.prepare_pictures(pictures, options, log=lambda message: None)
+    timings['prepare'] += time.perf_counter() - start
+
+    buffer = io.BytesIO()
+    if options['engine'] == renderer.ENGINE_CANVAS:
+        import canvas_renderer
+
+        start = time.perf_counter()
+        canvas_renderer.render_pdf(buffer, no_ruas, nm_ruas, pictures, options, sources)
+        timings['render'] += time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        content = renderer.build_document(no_ruas, nm_ruas, pictures, options, sources)
+        timings['build'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pisasession.create_pdf(content, buffer, renderer.get_page_style(options), renderer.document_style,
+                               renderer.link_callback)
+        timings['render'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(renderer.get_output_path(src_dir, output_dir), 'wb') as fp:
+        fp.write(buffer.getbuffer())
+    timings['write'] += time.perf_counter() - start
+    return len(pictures)
+
+
+def run_benchmark(src_dir, options, repeat=3):
+    """Return the best time of every stage over ``repeat`` runs, in seconds.
+
+    Every run starts with an empty photo cache.
+    """
+    roads = [os.path.join(src_dir, basename) for basename in sorted(os.listdir(src_dir))]
+    roads = [road for road in roads if os.path.isdir(road) and renderer.parse_road(road) is not None]
+    best = dict.fromkeys(STAGES, float('inf'))
+    photos = 0
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='documentation-benchmark-')
+        try:
+            run_options = dict(options, cache_dir=os.path.join(work_dir, 'cache'))
+            timings = dict.fromkeys(STAGES, 0.0)
+            photos = sum(time_road(road, work_dir, run_options, timings) for road in roads)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        for stage in STAGES:
+            best[stage] = min(best[stage], timings[stage])
+    return {'roads': len(roads), 'photos': photos, 'stages': best, 'total': sum(best.values())}
+
+
+def compare(result, baseline, tolerance, min_seconds):
+    """Print every stage next to the baseline and return the regressed stages."""
+    regressions = []
+    print('{:<8} {:>10} {:>10} {:>8}'.format('stage', 'baseline', 'current', 'change'))
+    for stage in STAGES + ('total',):
+        current = result['total'] if stage == 'total' else result['stages'][stage]
+        previous = baseline['total'] if stage == 'total' else baseline['stages'].get(stage)
+        if previous is None:
+            continue
+        change = (current - previous) / previous * 100 if previous else 0.0
+        regressed = current > previous * (1 + tolerance) and current - previous > min_seconds
+        if regressed:
+            regressions.append(stage)
+        print('{:<8} {:>9.3f}s {:>9.3f}s {:>+7.1f}%{}'.format(
+            stage, previous, current, change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the documentation pipeline.')
+    parser.add_argument('--source', help='benchmark an existing source tree instead of a synthetic one')
+    parser.add_argument('--generate', metavar='DIR', help='generate the synthetic tree in DIR and keep it')
+    parser.add_argument('--roads', type=int, default=3, help='synthetic road folders (default: 3)')
+    parser.add_argument('--photos', type=int, default=60, help='synthetic photos per road (default: 60)')
+    parser.add_argument('--photo-size', default='1600x1200', help='synthetic photo size (default: 1600x1200)')
+    parser.add_argument('--png-ratio', type=float, default=0.1, help='share of PNG photos (default: 0.1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', choices=(renderer.ENGINE_HTML, renderer.ENGINE_CANVAS),
+                        default=renderer.ENGINE_HTML)
+    parser.add_argument('--dpi', type=int, default=renderer.DEFAULT_OPTIONS['dpi'],
+                        help='photo resolution, 0 embeds the original photos')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best is kept')
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with the results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed slowdown per stage, as a fraction (default: 0.1)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='ignore slowdowns smaller than this (default: 0.05)')
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    try:
+        size = tuple(int(n) for n in args.photo_size.lower().split('x'))
+    except ValueError:
+        size = ()
+    if len(size) != 2:
+        parser.error('invalid photo size: ' + args.photo_size)
+
+    options = dict(renderer.DEFAULT_OPTIONS, title='DOKUMENTASI', engine=args.engine, dpi=args.dpi)
+    config = {'engine': args.engine, 'dpi': args.dpi, 'repeat': args.repeat}
+    src_dir = args.source
+    generated_dir = None
+    if src_dir is None:
+        src_dir = args.generate or tempfile.mkdtemp(prefix='documentation-survey-')
+        generated_dir = None if args.generate else src_dir
+        start = time.perf_counter()
+        generate_survey(src_dir, args.roads, args.photos, size, args.png_ratio, args.seed)
+        print('Generated {} roads of {} photos in {:.1f} s'.format(
+            args.roads, args.photos, time.perf_counter() - start))
+        config.update(roads=args.roads, photos=args.photos, photo_size=list(size),
+                      png_ratio=args.png_ratio, seed=args.seed)
+    else:
+        config['source'] = os.path.abspath(src_dir)
+
+    try:
+        result = run_benchmark(src_dir, options, args.repeat)
+    finally:
+        if generated_dir is not None:
+            shutil.rmtree(generated_dir, ignore_errors=True)
+
+    result = dict(version=RESULT_VERSION, created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  python=platform.python_version(), platform=platform.platform(),
+                  config=config, **result)
+    print('{} roads, {} photos'.format(result['roads'], result['photos']))
+    for stage in STAGES:
+        print('{:<8} {:>9.3f}s'.format(stage, result['stages'][stage]))
+    print('{:<8} {:>9.3f}s'.format('total', result['total']))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(result, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fp:
+            baseline = json.load(fp)
+        if baseline.get('config') != config:
+            print('Warning: the baseline was run with a different configuration')
+        regressions = compare(result, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print('Regressions: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Native rendering engine that draws the documentation pages straight onto a
+reportlab canvas, without going through HTML and xhtml2pdf."""
+
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+import imagecache
+import layout
+import renderer
+from metrics import Metrics
+
+# Matrix (a, b, c, d, e, f) that maps the unit square of a photo as stored to
+# the unit square of the upright photo, for every EXIF orientation
+ORIENTATION_MATRIX = {
+    2: (-1, 0, 0, 1, 1, 0),
+    3: (-1, 0, 0, -1, 1, 1),
+    4: (1, 0, 0, -1, 0, 1),
+    5: (0, -1, -1, 0, 1, 1),
+    6: (0, -1, 1, 0, 0, 1),
+    7: (0, 1, 1, 0, 0, 0),
+    8: (0, 1, -1, 0, 1, 0),
+}
+
+
+def draw_text(pdf, page_height, text):
+    pdf.setFont(text.font, text.size)
+    if text.align == 'center':
+        pdf.drawCentredString(text.x, page_height - text.y, text.text)
+    else:
+        pdf.drawString(text.x, page_height - text.y, text.text)
+
+
+def draw_photo(pdf, page_height, src, rect):
+    """Draw a photo into ``rect`` keeping its aspect ratio, at the top center.
+
+    JPEGs are embedded without decoding them, so their EXIF orientation is
+    applied by transforming the page instead of rotating the pixels.
+    """
+    orientation = 1
+    if imagecache.is_jpeg(src):
+        try:
+            orientation, width, height = imagecache.read_orientation(src)
+        except (OSError, ValueError):
+            pass
+    if orientation == 1:
+        pdf.drawImage(src, rect.x, page_height - rect.y - rect.height, rect.width, rect.height,
+                      preserveAspectRatio=True, anchor='n')
+        return
+
+    if orientation in imagecache.ROTATED:
+        width, height = height, width
+    scale = min(rect.width / width, rect.height / height)
+    width, height = width * scale, height * scale
+    pdf.saveState()
+    pdf.translate(rect.x + (rect.width - width) / 2, page_height - rect.y - height)
+    pdf.scale(width, height)
+    pdf.transform(*ORIENTATION_MATRIX[orientation])
+    pdf.drawImage(src, 0, 0, 1, 1)
+    pdf.restoreState()
+
+
+def draw_page(pdf, page, logo_src, sources):
+    height = page.height
+    logo = page.logo
+    pdf.drawImage(logo_src, logo.x, height - logo.y - logo.height, logo.width, logo.height,
+                  mask='auto', preserveAspectRatio=True, anchor='nw')
+    for text in page.texts:
+        draw_text(pdf, height, text)
+
+    pdf.setLineWidth(1)
+    for box in page.boxes:
+        rect = box.rect
+        pdf.rect(rect.x, height - rect.y - rect.height, rect.width, rect.height)
+        pdf.setFont(layout.FONT_BOLD, layout.BOX_FONT_SIZE)
+        pdf.drawCentredString(rect.x + rect.width / 2, height - rect.y - layout.BOX_BASELINE, box.text)
+
+    for cell, src in zip(page.cells, sources):
+        draw_photo(pdf, height, src, cell.image)
+        for text in cell.captions:
+            draw_text(pdf, height, text)
+
+
+def get_layout(options, no_ruas, page_number, captions):
+    page_width, page_height = renderer.get_page_dimensions(options)
+    no_distribusi, no_leger = renderer.get_header_numbers(options, no_ruas, page_number)
+    return layout.get_page_layout(
+        page_width * cm, page_height * cm,
+        renderer.to_cm(options['margin_top']) * cm,
+        renderer.to_cm(options['margin_left']) * cm,
+        renderer.to_cm(options['margin_right']) * cm,
+        options['title'], no_distribusi, no_leger, captions)
+
+
+def render_pdf(output, no_ruas, nm_ruas, pictures, options, sources=None, progress=None, cancel=None,
+               first_page=1, metrics=None):
+    """Draw the pages of a road onto a reportlab canvas and save it to ``output``.
+
+    Takes the same arguments as :func:`renderer.build_document`. ``progress``
+    is reported after every page, with one step left over for saving the PDF.
+    Drawing counts as the ``render`` stage of ``metrics`` and saving as the
+    ``write`` stage. ``output`` may also be a binary file object.
+    """
+    metrics = metrics or Metrics()
+    if not isinstance(output, str):
+        with metrics.stage('render'):
+            return _render_pdf(output, no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page,
+                               metrics)
+    with renderer.atomic_write(output) as tmp_output, metrics.stage('render'):
+        return _render_pdf(tmp_output, no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page,
+                           metrics)
+
+
+def _render_pdf(output, no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page, metrics):
+    sources = sources or {}
+    logo_src = sources.get(renderer.logo, renderer.logo)
+    page_count = (len(pictures) + 5) // 6
+    if progress is not None:
+        progress(0, page_count + 1)
+
+    page_width, page_height = renderer.get_page_dimensions(options)
+    pdf = canvas.Canvas(output, pagesize=(page_width * cm, page_height * cm))
+    pdf.setTitle('Document')
+    for page_idx in range(page_count):
+        if cancel is not None and cancel.is_set():
+            raise renderer.Cancelled()
+        page_pictures = pictures[page_idx * 6:(page_idx + 1) * 6]
+        captions = [(no_ruas, nm_ruas, renderer.get_sta(photo)) for photo in page_pictures]
+        page = get_layout(options, no_ruas, first_page + page_idx, captions)
+        draw_page(pdf, page, logo_src, [sources.get(photo.path, photo.path) for photo in page_pictures])
+        pdf.showPage()
+        if progress is not None:
+            progress(page_idx + 1, page_count + 1)
+    with metrics.stage('write'):
+        pdf.save()
+    return 0
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Persistent SQLite catalog of the photos of a survey.
+
+    python catalog.py CATALOG SOURCE --duplicates --missing
+
+Every photo is kept as one row with its road, station, chainage in meters,
+side, size, modification time, dimensions and content hash. Updating a road
+only reads the photos whose size or modification time changed, so the
+hashes and dimensions of unchanged photos come from the catalog. The rows
+are returned ordered by chainage, so ``STA 2+000`` comes before
+``STA 10+000``.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+
+from PIL import Image
+
+import imagecache
+import renderer
+import scanner
+
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS photos (
+    path TEXT PRIMARY KEY,
+    road TEXT NOT NULL,
+    no_ruas TEXT NOT NULL,
+    nm_ruas TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sta TEXT NOT NULL,
+    chainage INTEGER,
+    side TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS photos_road ON photos (road, chainage);
+'''
+
+ORDER = 'ORDER BY chainage IS NULL, chainage, name, path'
+
+# A station with more than one photo on the same side of a road
+Duplicate = namedtuple('Duplicate', ['road', 'chainage', 'side', 'paths'])
+# A gap in the stations of a road, ``chainage`` is the first missing one
+Gap = namedtuple('Gap', ['road', 'chainage', 'count'])
+
+
+def format_chainage(chainage):
+    return '{}+{:03d}'.format(chainage // 1000, chainage % 1000)
+
+
+def read_photo(path):
+    """Return ``(width, height, digest)`` of a photo, the dimensions are None
+    if the image cannot be read."""
+    digest = imagecache.file_hash(path)
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+    except (OSError, ValueError):
+        width = height = None
+    return width, height, digest
+
+
+class Catalog:
+    """Connection to a catalog file, created on first use."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Several processes of a batch may update the catalog at once
+        self.connection = sqlite3.connect(filename, timeout=60)
+        if self.get_version() != SCHEMA_VERSION:
+            self.create_schema()
+
+    def get_version(self):
+        return self.connection.execute('PRAGMA user_version').fetchone()[0]
+
+    def create_schema(self):
+        # Another process may be creating the catalog too, the version is
+        # checked again while holding the write lock so only one of them does
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self.get_version() != SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS photos')
+                # executescript would commit the transaction
+                for statement in SCHEMA.split(';'):
+                    if statement.strip():
+                        self.connection.execute(statement)
+                self.connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update_road(self, src_dir):
+        """Bring the rows of a road folder up to date with the filesystem.
+
+        Returns the number of photos that were added or changed.
+        """
+        road = os.path.abspath(src_dir)
+        no_ruas, nm_ruas = renderer.parse_road(src_dir) or ('', '')
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in self.connection.execute(
+            'SELECT path, size, mtime_ns FROM photos WHERE road = ?', (road,))}
+
+        rows = []
+        for entry in scanner.walk(road):
+            stat = entry.stat()
+            known_state = known.pop(entry.path, None)
+            if known_state == (stat.st_size, stat.st_mtime_ns):
+                continue
+            sta, side = scanner.parse_sta(entry.name, os.path.basename(os.path.dirname(entry.path)))
+            width, height, digest = read_photo(entry.path)
+            rows.append((entry.path, road, no_ruas, nm_ruas, entry.name, sta, scanner.parse_chainage(sta), side,
+                         stat.st_size, stat.st_mtime_ns, width, height, digest))
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM photos WHERE path = ?', [(path,) for path in known])
+            self.connection.executemany('INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                        rows)
+        return len(rows)
+
+    def photos(self, src_dir):
+        """Return the :class:`scanner.Photo` records of a road folder, ordered by chainage."""
+        cursor = self.connection.execute(
+            'SELECT path, sta, side, size, mtime_ns, digest FROM photos WHERE road = ? ' + ORDER,
+            (os.path.abspath(src_dir),))
+        return [scanner.Photo(*row) for row in cursor]
+
+    def duplicates(self, src_dir=None):
+        """Return the :class:`Duplicate` stations of one road folder, or of every road."""
+        query = ('SELECT road, chainage, side, path FROM photos WHERE chainage IN '
+                 '(SELECT chainage FROM photos AS other WHERE other.road = photos.road AND other.side = photos.side '
+                 'GROUP BY chainage HAVING COUNT(*) > 1)')
+        params = ()
+        if src_dir is not None:
+            query += ' AND road = ?'
+            params = (os.path.abspath(src_dir),)
+        duplicates = {}
+        for road, chainage, side, path in self.connection.execute(query + ' ORDER BY road, chainage, side, path',
+                                                                  params):
+            duplicates.setdefault((road, chainage, side), []).append(path)
+        return [Duplicate(road, chainage, side, paths) for (road, chainage, side), paths in duplicates.items()]
+
+    def missing(self, src_dir=None, interval=None):
+        """Return the :class:`Gap` in the stations of one road folder, or of every road.
+
+        Stations are expected every ``interval`` meters, by default the most
+        common distance between the stations of the road.
+        """
+        query = 'SELECT DISTINCT road, chainage FROM photos WHERE chainage IS NOT NULL'
+        params = ()
+        if src_dir is not None:
+            query += ' AND road = ?'
+            params = (os.path.abspath(src_dir),)
+        stations = {}
+        for road, chainage in self.connection.execute(query + ' ORDER BY road, chainage', params):
+            stations.setdefault(road, []).append(chainage)
+
+        gaps = []
+        for road, chainages in stations.items():
+            steps = [b - a for a, b in zip(chainages, chainages[1:])]
+            step = interval or (max(set(steps), key=steps.count) if steps else 0)
+            if step <= 0:
+                continue
+            for a, b in zip(chainages, chainages[1:]):
+                count = (b - a) // step - 1
+                if count > 0:
+                    gaps.append(Gap(road, a + step, count))
+        return gaps
+
+
+def scan_road(filename, src_dir):
+    """Update the catalog ``filename`` from a road folder and return its photos."""
+    with Catalog(filename) as catalog:
+        catalog.update_road(src_dir)
+        return catalog.photos(src_dir)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Update the photo catalog and report on the stations.')
+    parser.add_argument('catalog', help='catalog file, created if it does not exist')
+    parser.add_argument('source', help='folder containing the road folders')
+    parser.add_argument('--duplicates', action='store_true', help='list the stations photographed more than once')
+    parser.add_argument('--missing', action='store_true', help='list the gaps between the stations')
+    parser.add_argument('--interval', type=int, metavar='METERS',
+                        help='with --missing, distance between the stations (default: the most common one)')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if not os.path.isdir(args.source):
+        print('Error: Invalid source directory', file=sys.stderr)
+        return 2
+
+    with Catalog(args.catalog) as catalog:
+        for road in sorted(os.listdir(args.source)):
+            src_dir = os.path.join(args.source, road)
+            if os.path.isdir(src_dir) and renderer.parse_road(src_dir) is not None:
+                changed = catalog.update_road(src_dir)
+                print('{}: {} photo(s), {} updated'.format(road, len(catalog.photos(src_dir)), changed))
+        if args.duplicates:
+            for duplicate in catalog.duplicates():
+                print('Duplicate: {} STA {} {}'.format(os.path.basename(duplicate.road),
+                                                       format_chainage(duplicate.chainage), duplicate.side))
+                for path in duplicate.paths:
+                    print('    ' + path)
+        if args.missing:
+            for gap in catalog.missing(interval=args.interval):
+                print('Missing: {} {} station(s) from STA {}'.format(os.path.basename(gap.road), gap.count,
+                                                                     format_chainage(gap.chainage)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
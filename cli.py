@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""Headless batch mode, for unattended runs without a display.
+
+    python cli.py SOURCE OUTPUT --title "DOKUMENTASI" --workers 4
+    python cli.py --job nightly.ini --summary summary.json
+    python cli.py SOURCE OUTPUT --resume
+    python cli.py SOURCE OUTPUT --watch
+    python cli.py SOURCE OUTPUT --distributed
+
+A job file uses the sections and keys of ``documentation.ini``, so the
+settings saved by the GUI can be reused as is. Command line arguments
+override the job file. PyQt5 is never imported.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import signal
+import sys
+import threading
+
+import batch
+import renderer
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = 3
+
+# Job file keys, as (section, key, option name)
+JOB_KEYS = (
+    ('Input', 'Source', 'source'),
+    ('Input', 'Output', 'output'),
+    ('Input', 'Title', 'title'),
+    ('Input', 'DistributionNumber', 'no_distribusi'),
+    ('Input', 'PageNumber', 'no_leger'),
+    ('Input', 'Supervisor', 'supervisor'),
+    ('Page', 'Size', 'paper_size'),
+    ('Page', 'Orientation', 'paper_orientation'),
+    ('Page', 'Width', 'paper_width'),
+    ('Page', 'Height', 'paper_height'),
+    ('Margin', 'Top', 'margin_top'),
+    ('Margin', 'Bottom', 'margin_bottom'),
+    ('Margin', 'Left', 'margin_left'),
+    ('Margin', 'Right', 'margin_right'),
+    ('Process', 'PhotoDPI', 'dpi'),
+    ('Process', 'Engine', 'engine'),
+    ('Process', 'Workers', 'workers'),
+    ('Process', 'ChunkPages', 'chunk_pages'),
+    ('Process', 'MemoryLimit', 'memory_limit'),
+    ('Process', 'Catalog', 'catalog'),
+    ('Process', 'PipelineWorkers', 'pipeline_workers'),
+    ('Process', 'PipelineDepth', 'pipeline_depth'),
+    ('Process', 'SkipUnchanged', 'incremental'),
+)
+
+
+def load_job(filename):
+    """Read a job file and return its values keyed by option name."""
+    config = configparser.ConfigParser(interpolation=None)
+    config.optionxform = str
+    if not config.read(filename, encoding='utf-8'):
+        raise OSError('Cannot read job file: ' + filename)
+
+    job = {}
+    for section, key, name in JOB_KEYS:
+        value = config.get(section, key, fallback=None)
+        if value is None:
+            continue
+        # QSettings quotes values that contain commas
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        job[name] = value
+    if 'dpi' in job:
+        job['dpi'] = int(job['dpi'])
+    if 'workers' in job:
+        job['workers'] = int(job['workers'])
+    if 'chunk_pages' in job:
+        job['chunk_pages'] = int(job['chunk_pages'])
+    if 'memory_limit' in job:
+        job['memory_limit'] = int(job['memory_limit'])
+    if 'pipeline_workers' in job:
+        job['pipeline_workers'] = int(job['pipeline_workers'])
+    if 'pipeline_depth' in job:
+        job['pipeline_depth'] = int(job['pipeline_depth'])
+    if 'incremental' in job:
+        job['incremental'] = job['incremental'].lower() == 'true'
+    return job
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Render the photo documentation of every road folder.')
+    parser.add_argument('source', nargs='?', help='folder containing the road folders')
+    parser.add_argument('output', nargs='?', help='folder where the PDF files are written')
+    parser.add_argument('--job', metavar='FILE', help='read the settings from a job file')
+    parser.add_argument('--title')
+    parser.add_argument('--no-distribusi', dest='no_distribusi', metavar='NUMBER', help='distribution number')
+    parser.add_argument('--no-leger', dest='no_leger', metavar='NUMBER',
+                        help='leger number, e.g. "15 000 -- K 000 1"')
+    parser.add_argument('--supervisor')
+    parser.add_argument('--paper-size', dest='paper_size', help='e.g. A3, A4 or Custom')
+    parser.add_argument('--orientation', dest='paper_orientation', choices=('Portrait', 'Landscape'))
+    parser.add_argument('--paper-width', dest='paper_width', metavar='CM', help='width of a Custom paper')
+    parser.add_argument('--paper-height', dest='paper_height', metavar='CM', help='height of a Custom paper')
+    parser.add_argument('--margin-top', dest='margin_top', metavar='CM')
+    parser.add_argument('--margin-bottom', dest='margin_bottom', metavar='CM')
+    parser.add_argument('--margin-left', dest='margin_left', metavar='CM')
+    parser.add_argument('--margin-right', dest='margin_right', metavar='CM')
+    parser.add_argument('--dpi', type=int, help='photo resolution, 0 embeds the original photos')
+    parser.add_argument('--engine', choices=(renderer.ENGINE_HTML, renderer.ENGINE_CANVAS))
+    parser.add_argument('--workers', type=int, help='number of road folders rendered in parallel')
+    parser.add_argument('--chunk-pages', dest='chunk_pages', type=int, metavar='PAGES',
+                        help='split roads with more pages into chunks rendered in parallel, 0 disables it')
+    parser.add_argument('--chunk-workers', dest='chunk_workers', type=int,
+                        help='number of chunks rendered in parallel per road')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=int, metavar='MB',
+                        help='render roads that would need more memory in parts, one after the other, 0 disables it')
+    parser.add_argument('--catalog', metavar='FILE',
+                        help='keep the photo records in this SQLite catalog and only read changed photos')
+    parser.add_argument('--pipeline-workers', dest='pipeline_workers', type=int,
+                        help='threads preparing the photos while the pages are rendered, 0 prepares them first')
+    parser.add_argument('--pipeline-depth', dest='pipeline_depth', type=int, metavar='PAGES',
+                        help='pages the photos are prepared ahead of the page being rendered (default: 4)')
+    parser.add_argument('--skip-unchanged', dest='incremental', action=argparse.BooleanOptionalAction,
+                        help='skip roads whose photos and settings have not changed')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the batch that was interrupted in OUTPUT after its last finished road')
+    parser.add_argument('--summary', metavar='FILE', help='write a JSON summary, "-" for standard output')
+    parser.add_argument('--metrics', metavar='FILE', help='append the timings of every road to a JSON lines file')
+    parser.add_argument('--profile', dest='profile_dir', metavar='DIR',
+                        help='write a cProfile dump of the render stage of every road to DIR')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and render every road whose photos change')
+    parser.add_argument('--debounce', type=float, metavar='SECONDS',
+                        help='with --watch, wait until a road has not changed for this long (default: 10)')
+    parser.add_argument('--polling', action='store_true',
+                        help='with --watch, rescan the folders instead of using inotify, e.g. on network shares')
+    parser.add_argument('--poll-interval', dest='poll_interval', type=float, metavar='SECONDS',
+                        help='with --polling, seconds between rescans (default: 5)')
+    parser.add_argument('--distributed', action='store_true',
+                        help='share the roads with workers on other machines through a job folder')
+    parser.add_argument('--job-dir', dest='job_dir', metavar='DIR',
+                        help='with --distributed, the shared job folder (default: OUTPUT/documentation-jobs)')
+    parser.add_argument('--lease-timeout', dest='lease_timeout', type=float, metavar='SECONDS',
+                        help='with --distributed, reclaim a road whose worker was silent this long (default: 120)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors and the summary')
+    return parser
+
+
+def get_job(args):
+    """Merge the defaults, the job file and the command line arguments."""
+    job = dict(renderer.DEFAULT_OPTIONS, source=None, output=None,
+               workers=batch.default_workers(), incremental=True)
+    if args.job:
+        job.update(load_job(args.job))
+    for name, value in vars(args).items():
+        if name in job and value is not None:
+            job[name] = value
+    if job['workers'] < 1:
+        raise ValueError('The number of workers must be at least 1')
+    for name in ('chunk_workers', 'pipeline_workers'):
+        if job[name] < 0:
+            raise ValueError('The number of {} must not be negative'.format(name.replace('_', ' ')))
+    if not job['chunk_workers']:
+        job['chunk_workers'] = max(1, batch.default_workers() // job['workers'])
+    return job
+
+
+def exit_status(results):
+    if any(result.status == batch.CANCELLED for result in results):
+        return EXIT_CANCELLED
+    if any(result.status == batch.FAILED for result in results):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def summarize(job, results):
+    """Return the machine-readable summary of a batch."""
+    counts = {}
+    roads = []
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+        roads.append({
+            'road': result.road,
+            'status': result.status,
+            'error': result.error,
+            'pictures': len(result.inputs['photos']) if result.inputs else None,
+        })
+    return {
+        'source': job['source'],
+        'output': job['output'],
+        'exit_status': exit_status(results),
+        'counts': counts,
+        'roads': sorted(roads, key=lambda road: road['road']),
+    }
+
+
+def write_summary(summary, filename):
+    content = json.dumps(summary, indent=2, ensure_ascii=False)
+    if filename == '-':
+        print(content)
+        return
+    with open(filename, 'w', encoding='utf-8') as fp:
+        fp.write(content + '\n')
+
+
+def print_error(message):
+    print(message, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    try:
+        job = get_job(args)
+    except (OSError, ValueError, configparser.Error) as e:
+        print_error('Error: ' + str(e))
+        return EXIT_USAGE
+
+    if not (job['source'] and os.path.isdir(job['source'])):
+        print_error('Error: Invalid source directory')
+        return EXIT_USAGE
+    if not (job['output'] and os.path.isdir(job['output'])):
+        print_error('Error: Invalid output directory')
+        return EXIT_USAGE
+    # The folders are recorded in the manifest and passed to the worker processes
+    job['source'] = os.path.abspath(job['source'])
+    job['output'] = os.path.abspath(job['output'])
+
+    cancel = threading.Event()
+
+    def stop(signum, frame):
+        print_error('# Cancelling after the current page...')
+        cancel.set()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    options = {key: job[key] for key in renderer.DEFAULT_OPTIONS}
+    log = (lambda message: None) if args.quiet else print_error
+    if args.watch:
+        return watch(job, options, args, log, cancel)
+    if args.distributed:
+        return distribute(job, options, args, log, cancel)
+
+    log('Processing source directory "{}"'.format(job['source']))
+    results = batch.run_batch(job['source'], job['output'], options,
+                              workers=job['workers'], log=log, cancel=cancel,
+                              incremental=job['incremental'], metrics_file=args.metrics, resume=args.resume)
+
+    print_results(results)
+    summary = summarize(job, results)
+    if args.summary:
+        write_summary(summary, args.summary)
+    return summary['exit_status']
+
+
+def print_results(results):
+    for result in sorted(results, key=lambda result: result.road):
+        line = '{:<10} {}'.format(result.status, result.road)
+        if result.error:
+            line += ': ' + result.error
+        print_error(line)
+
+
+def watch(job, options, args, log, cancel):
+    import watcher
+
+    watcher.watch(job['source'], job['output'], options, workers=job['workers'], log=log, cancel=cancel,
+                  debounce=watcher.DEFAULT_DEBOUNCE if args.debounce is None else args.debounce,
+                  polling=args.polling,
+                  poll_interval=watcher.DEFAULT_POLL_INTERVAL if args.poll_interval is None else args.poll_interval,
+                  metrics_file=args.metrics, quiet=args.quiet, on_results=print_results)
+    return EXIT_OK
+
+
+def distribute(job, options, args, log, cancel):
+    import distributed
+
+    results = distributed.run_worker(
+        job['source'], job['output'], options, job_dir=args.job_dir, log=log, cancel=cancel,
+        lease_timeout=distributed.DEFAULT_LEASE_TIMEOUT if args.lease_timeout is None else args.lease_timeout,
+        metrics_file=args.metrics)
+    print_results(results)
+    summary = summarize(job, results)
+    if args.summary:
+        write_summary(summary, args.summary)
+    return summary['exit_status']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Render a road folder with both engines and compare speed and appearance.
+
+    python compare_engines.py "path/to/001 - NAMA RUAS" --pages 10
+
+The visual check rasterizes both PDFs with PyMuPDF (``pip install pymupdf``)
+and reports the mean pixel difference of every page. Without PyMuPDF the
+comparison fails, unless the check is turned off with ``--no-visual``.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+import canvas_renderer
+import renderer
+
+
+def render_html(output, no_ruas, nm_ruas, pictures, options, sources):
+    content = renderer.build_document(no_ruas, nm_ruas, pictures, options, sources)
+    return renderer.convert_to_pdf(content, output, log=lambda message: None,
+                                   page_style=renderer.get_page_style(options))
+
+
+def render_canvas(output, no_ruas, nm_ruas, pictures, options, sources):
+    return canvas_renderer.render_pdf(output, no_ruas, nm_ruas, pictures, options, sources)
+
+
+def best_time(render, repeat, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def rasterize(filename, dpi):
+    import fitz
+
+    pages = []
+    with fitz.open(filename) as document:
+        for page in document:
+            pixmap = page.get_pixmap(dpi=dpi)
+            pages.append(Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples).convert('L'))
+    return pages
+
+
+def compare_pages(html_pdf, canvas_pdf, dpi, threshold):
+    """Print the difference of every page and return True if all pages match."""
+    html_pages = rasterize(html_pdf, dpi)
+    canvas_pages = rasterize(canvas_pdf, dpi)
+
+    if len(html_pages) != len(canvas_pages):
+        print('Page count differs: html {}, canvas {}'.format(len(html_pages), len(canvas_pages)))
+        return False
+
+    equivalent = True
+    for page_number, (html_page, canvas_page) in enumerate(zip(html_pages, canvas_pages), 1):
+        if html_page.size != canvas_page.size:
+            print('Page {}: size differs: html {}, canvas {}'.format(page_number, html_page.size, canvas_page.size))
+            equivalent = False
+            continue
+        difference = ImageStat.Stat(ImageChops.difference(html_page, canvas_page)).mean[0] / 255 * 100
+        matches = difference <= threshold
+        equivalent = equivalent and matches
+        print('Page {}: {:.2f}% difference{}'.format(page_number, difference, '' if matches else ' (too different)'))
+    return equivalent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the HTML and the native reportlab engine.')
+    parser.add_argument('road', help='road folder, e.g. "001 - NAMA RUAS"')
+    parser.add_argument('--pages', type=int, default=5, help='number of pages to render (default: 5)')
+    parser.add_argument('--dpi', type=int, default=renderer.DEFAULT_OPTIONS['dpi'],
+                        help='photo resolution, 0 embeds the original photos')
+    parser.add_argument('--repeat', type=int, default=3, help='renders per engine, the best time is reported')
+    parser.add_argument('--raster-dpi', type=int, default=50, help='resolution of the visual check')
+    parser.add_argument('--threshold', type=float, default=1.0,
+                        help='largest mean pixel difference per page, in percent (default: 1.0)')
+    parser.add_argument('--keep', metavar='DIR', help='keep both PDFs in this directory')
+    parser.add_argument('--no-visual', dest='visual', action='store_false',
+                        help='only compare the speed, e.g. without PyMuPDF')
+    args = parser.parse_args(argv)
+    if args.visual:
+        try:
+            import fitz  # noqa: F401
+        except ImportError:
+            parser.error('the visual check requires PyMuPDF (pip install pymupdf), or use --no-visual')
+
+    road = renderer.parse_road(args.road)
+    if road is None:
+        parser.error('invalid road folder: ' + args.road)
+    no_ruas, nm_ruas = road
+    options = dict(renderer.DEFAULT_OPTIONS, title='DOKUMENTASI', dpi=args.dpi)
+    pictures = renderer.find_pictures(args.road)[:args.pages * 6]
+    sources = renderer.prepare_pictures(pictures, options)
+
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+    output_dir = args.keep or tempfile.mkdtemp()
+    html_pdf = os.path.join(output_dir, 'html.pdf')
+    canvas_pdf = os.path.join(output_dir, 'canvas.pdf')
+    render_args = (no_ruas, nm_ruas, pictures, options, sources)
+    html_time = best_time(render_html, args.repeat, html_pdf, *render_args)
+    canvas_time = best_time(render_canvas, args.repeat, canvas_pdf, *render_args)
+
+    print('Pictures: {}'.format(len(pictures)))
+    print('html:   {:.3f} s, {} bytes'.format(html_time, os.path.getsize(html_pdf)))
+    print('canvas: {:.3f} s, {} bytes'.format(canvas_time, os.path.getsize(canvas_pdf)))
+    print('Speedup: {:.1f}x'.format(html_time / canvas_time if canvas_time else float('inf')))
+
+    equivalent = not args.visual or compare_pages(html_pdf, canvas_pdf, args.raster_dpi, args.threshold)
+    if not args.keep:
+        os.remove(html_pdf)
+        os.remove(canvas_pdf)
+        os.rmdir(output_dir)
+    return 0 if equivalent else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
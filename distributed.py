@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Render one source tree from several machines through a shared job folder.
+
+    python cli.py SOURCE OUTPUT --distributed
+
+Every worker walks the road folders and claims a road by creating
+``<road>.lease`` in the job folder with ``O_CREAT | O_EXCL``, which only
+one worker can do. While rendering it touches the lease every
+``lease_timeout / 4`` seconds. A lease that has not been touched for
+``lease_timeout`` seconds, measured with the clock of the file server, is
+stale: its worker crashed and any worker may reclaim it. A worker that
+finds its own lease taken over stops rendering that road.
+
+When a road is finished its record ``<road>.json`` is written, holding the
+status and the inputs like an entry of the build manifest. Roads whose
+record matches their current photos and settings are not rendered again,
+except failed roads, which are tried again up to ``MAX_ATTEMPTS`` times in
+case the error was transient. A worker returns once every road has a
+matching record.
+"""
+
+import errno
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+import batch
+import manifest
+import renderer
+from metrics import write_record
+
+DEFAULT_JOB_DIRNAME = 'documentation-jobs'
+DEFAULT_LEASE_TIMEOUT = 120
+DEFAULT_POLL_INTERVAL = 10
+# Times a failed road is rendered before it is recorded as finished
+MAX_ATTEMPTS = 3
+
+
+def get_worker_id():
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+def server_time(job_dir):
+    """Return the current time of the file server holding ``job_dir``, so
+    leases compare with one clock whatever the clocks of the workers are."""
+    fd, filename = tempfile.mkstemp(prefix='.clock-', dir=job_dir)
+    try:
+        return os.fstat(fd).st_mtime
+    finally:
+        os.close(fd)
+        os.remove(filename)
+
+
+def read_json(filename):
+    try:
+        with open(filename, 'r', encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+class Lease:
+    """The claim of a worker on a road, kept alive by a background thread.
+
+    ``lost`` is set when another worker reclaimed the road.
+    """
+
+    def __init__(self, filename, worker_id, lease_timeout):
+        self.filename = filename
+        self.worker_id = worker_id
+        self.lease_timeout = lease_timeout
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+
+    @classmethod
+    def acquire(cls, job_dir, road, worker_id, lease_timeout):
+        """Return the lease of ``road``, or None if another worker holds it."""
+        filename = os.path.join(job_dir, road + '.lease')
+        for _ in range(2):
+            try:
+                fd = os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not reclaim(filename, server_time(job_dir), lease_timeout):
+                    return None
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                json.dump({'worker': worker_id, 'claimed': time.strftime('%Y-%m-%dT%H:%M:%S')}, fp)
+            lease = cls(filename, worker_id, lease_timeout)
+            lease._thread.start()
+            return lease
+        return None
+
+    def is_held(self):
+        data = read_json(self.filename)
+        return data is not None and data.get('worker') == self.worker_id
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease_timeout / 4):
+            if not self.is_held():
+                self.lost.set()
+                return
+            try:
+                os.utime(self.filename)
+            except OSError:
+                self.lost.set()
+                return
+
+    def release(self):
+        self._stop.set()
+        self._thread.join()
+        if self.is_held():
+            try:
+                os.remove(self.filename)
+            except FileNotFoundError:
+                pass
+
+
+def reclaim(filename, now, lease_timeout):
+    """Remove the lease ``filename`` if it is stale. Returns True if the road may be claimed again.
+
+    The stale lease is first renamed to a name of its own, which only one of
+    several reclaiming workers can do.
+    """
+    try:
+        age = now - os.stat(filename).st_mtime
+    except FileNotFoundError:
+        return True
+    if age < lease_timeout:
+        return False
+    stale = '{}.stale-{}'.format(filename, uuid.uuid4().hex)
+    try:
+        os.rename(filename, stale)
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.EEXIST, errno.EACCES):
+            return False
+        raise
+    os.remove(stale)
+    return True
+
+
+class CancelEither:
+    """Set when any of ``events`` is set, for the ``cancel`` argument of the renderer."""
+
+    def __init__(self, *events):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self.events)
+
+
+def is_recorded(record, inputs, output):
+    """Return True if ``record`` shows the road was finished with ``inputs``.
+    A failed road counts as finished after ``MAX_ATTEMPTS`` attempts."""
+    if record is None or record.get('settings') != inputs['settings'] or record.get('photos') != inputs['photos']:
+        return False
+    if record.get('status') == batch.FAILED:
+        return record.get('attempts', 1) >= MAX_ATTEMPTS
+    return record.get('status') != batch.DONE or manifest.is_up_to_date(record, inputs, output)
+
+
+def get_attempts(record, inputs):
+    """Return the failed attempts of a road with ``inputs`` recorded in ``record``."""
+    if (record is None or record.get('status') != batch.FAILED or record.get('settings') != inputs['settings']
+            or record.get('photos') != inputs['photos']):
+        return 0
+    return record.get('attempts', 1)
+
+
+def run_worker(src_dir, output_dir, options, job_dir=None, log=print, cancel=None,
+               lease_timeout=DEFAULT_LEASE_TIMEOUT, poll_interval=DEFAULT_POLL_INTERVAL, metrics_file=None):
+    """Claim and render roads until every road of ``src_dir`` is recorded in
+    ``job_dir``, by default ``documentation-jobs`` in ``output_dir``.
+
+    Returns the :class:`batch.RoadResult` of the roads rendered by this worker.
+    """
+    job_dir = job_dir or os.path.join(output_dir, DEFAULT_JOB_DIRNAME)
+    os.makedirs(job_dir, exist_ok=True)
+    worker_id = get_worker_id()
+    log('# Worker {}, job folder "{}"'.format(worker_id, job_dir))
+    results = []
+
+    while cancel is None or not cancel.is_set():
+        waiting = []
+        retrying = []
+        for road in sorted(batch.list_roads(src_dir)):
+            if cancel is not None and cancel.is_set():
+                break
+            basename = os.path.basename(road)
+            if renderer.parse_road(road) is None:
+                continue
+            record_filename = os.path.join(job_dir, basename + '.json')
+            output = renderer.get_output_path(road, output_dir)
+            pictures = renderer.find_pictures(road, options.get('catalog'))
+            inputs = manifest.road_inputs(road, pictures, options)
+            if is_recorded(read_json(record_filename), inputs, output):
+                continue
+
+            lease = Lease.acquire(job_dir, basename, worker_id, lease_timeout)
+            if lease is None:
+                waiting.append(basename)
+                continue
+            try:
+                # The road may have been finished while the lease was being claimed
+                record = read_json(record_filename)
+                if is_recorded(record, inputs, output):
+                    continue
+                attempts = get_attempts(record, inputs)
+                result = batch.render_road(road, output_dir, options, log, cancel=CancelEither(cancel, lease.lost),
+                                           scan=lambda: pictures)
+                if lease.lost.is_set():
+                    log('# Lease of {} was taken over by another worker'.format(basename))
+                    continue
+                results.append(result)
+                if result.status != batch.CANCELLED:
+                    record = manifest.make_entry(inputs, output)
+                    record.update(status=result.status, error=result.error, worker=worker_id)
+                    if result.status == batch.FAILED:
+                        record['attempts'] = attempts + 1
+                        if record['attempts'] < MAX_ATTEMPTS:
+                            retrying.append(basename)
+                    manifest.write_json(record_filename, record)
+                if result.status == batch.DONE and metrics_file:
+                    write_record(metrics_file, result.metrics)
+            finally:
+                lease.release()
+
+        if not (waiting or retrying) or (cancel is not None and cancel.is_set()):
+            break
+        if retrying:
+            log('# Trying {} failed road(s) again'.format(len(retrying)))
+        if waiting:
+            log('# Waiting for {} road(s) claimed by other workers'.format(len(waiting)))
+        if cancel is not None:
+            cancel.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+    return results
@@ -1,260 +1,75 @@
 # -*- coding: utf-8 -*-
 
-import os
-import re
-import sys
-from glob import glob
+import time
 
-from bs4 import BeautifulSoup
-from PyQt5.QtCore import QSettings
-from PyQt5.QtGui import QDoubleValidator
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QWidget
-from xhtml2pdf import pisa
-from reportlab.lib import pagesizes
+START_TIME = time.perf_counter()
 
-from logger import create_logger
-from ui_documentation import Ui_Form
+import logging  # noqa: E402
+import multiprocessing  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+
+from PyQt5.QtCore import QSettings, QThread, QTimer  # noqa: E402
+from PyQt5.QtGui import QDoubleValidator, QPixmap  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QFileDialog, QHeaderView, QMessageBox, QWidget  # noqa: E402
+
+import renderer  # noqa: E402
+from batch import CANCELLED, SKIPPED, default_workers, list_roads  # noqa: E402
+from logger import LEVELS, BufferHandler, create_logger, set_level, shutdown_logger  # noqa: E402
+from metrics import process_uptime  # noqa: E402
+from preview import THUMBNAIL_SIZE, PreviewModel  # noqa: E402
+from renderer import ENGINE_CANVAS, ENGINE_HTML, PAPER_SIZES  # noqa: E402
+from ui_documentation import Ui_Form  # noqa: E402
+from worker import BatchWorker, DraftWorker, ScanWorker  # noqa: E402
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 log_filename = os.path.join(BASE_DIR, 'documentation.log')
+metrics_filename = os.path.join(BASE_DIR, 'documentation-metrics.jsonl')
+profile_dir = os.path.join(BASE_DIR, 'profiles')
 settings_filename = os.path.join(BASE_DIR, 'documentation.ini')
-logo = os.path.join(BASE_DIR, 'logo.png')
-
-template = '''<!DOCTYPE html>
-<html>
-  <head>
-    <meta charset="UTF-8" />
-    <title>Document</title>
-
-    <style>
-      @page {
-        size: [PAGE_SIZE];
-
-        @frame content_frame {
-          top: [MARGIN_TOP];
-          left: [MARGIN_LEFT];
-          right: [MARGIN_RIGHT];
-        }
 
-        @frame footer_frame {
-          -pdf-frame-content: footer_content;
-          top: 26.5cm;
-          left: [MARGIN_LEFT];
-          right: [MARGIN_RIGHT];
-        }
-      }
-
-      body {
-        font-family: Helvetica sans-serif;
-      }
-
-      h1 {
-        font-size: 18pt;
-        margin: 0;
-      }
-
-      h2 {
-        font-size: 14pt;
-        margin: 0;
-      }
-
-      h3 {
-        font-size: 11pt;
-        font-weight: 500;
-        margin: 0;
-      }
-
-      table {
-        width: 100%;
-        border-collapse: collapse;
-      }
-
-      td.box {
-        width: 18pt;
-        height: 16pt;
-        border: 1pt solid black;
-        text-align: center;
-        padding-top: 2pt;
-      }
-
-      td.separator {
-        width: 6pt;
-      }
-
-      .valign-top {
-        vertical-align: top;
-      }
-
-      .valign-bottom {
-        vertical-align: bottom;
-      }
-
-      .table-box td {
-        font-weight: bold;
-        font-size: 10pt;
-        height: 16pt;
-      }
-
-      .header {
-        margin-bottom: 0.5cm;
-      }
-
-      .table-content {
-        page-break-after: always;
-      }
-
-      .table-content img {
-        width: 100%;
-      }
-
-      .img-container {
-        text-align: center;
-      }
-    </style>
-  </head>
-
-  <body>
-    <div id="footer_content" style="text-align: center; font-size: 10pt; font-weight: bold">
-      <p style="margin-bottom: 30pt">PENANGGUNG JAWAB LAPANGAN</p>
-      <p id="supervisor" style="text-decoration: underline; margin-bottom: 0"></p>
-      <p style="margin-top: 0">Team Leader</p>
-    </div>
-  </body>
-</html>
-'''
-
-header_template = '''<div class="header">
-    <table>
-    <tr>
-        <td width="30%" class="valign-top">
-        <table>
-            <tr>
-            <td width="1.6cm" class="valign-top">
-                <img class="logo" width="1.6cm" />
-            </td>
-            <td>
-                <h2>PEMERINTAH KOTA JAMBI</h2>
-                <h3>DINAS PEKERJAAN UMUM DAN PENATAAN RUANG</h3>
-                <p style="font-size: 8pt; margin: 0">
-                ALAMAT: JL. H. ZAINIR HAVIZ NO. 04, KEC. KOTABARU JAMBI TELP. 40553
-                </p>
-            </td>
-            </tr>
-        </table>
-        </td>
-        <td align="center">
-        <h1 class="title"></h1>
-        </td>
-        <td width="30%">
-        <table class="table-box">
-            <tr>
-            <td>
-                <table>
-                <tr class="no-distribusi">
-                    <td>NOMOR DISTRIBUSI KE</td>
-                </tr>
-                </table>
-            </td>
-            </tr>
-            <tr>
-            <td style="vertical-align: bottom">NOMOR LEMBAR KARTU LEGER JALAN:</td>
-            </tr>
-            <tr>
-            <td>
-                <table>
-                <tr class="no-leger">
-                    <td></td>
-                </tr>
-                </table>
-            </td>
-            </tr>
-        </table>
-        </td>
-    </tr>
-    </table>
-</div>
-'''
-
-table_template = '''
-<table class="table-content">
-    <tr>
-        <td class="cell-0"></td>
-        <td width="1cm"></td>
-        <td class="cell-1"></td>
-        <td width="1cm"></td>
-        <td class="cell-2"></td>
-    </tr>
-    <tr>
-        <td height="1cm"></td>
-    </tr>
-    <tr>
-        <td class="cell-3"></td>
-        <td width="1cm"></td>
-        <td class="cell-4"></td>
-        <td width="1cm"></td>
-        <td class="cell-5"></td>
-    </tr>
-</table>
-'''
-
-picture_template = '''
-<table>
-    <tr>
-        <td colspan="5" class="img-container">
-            <img>
-        </td>
-    </tr>
-    <tr>
-        <td height="24pt"></td>
-    </tr>
-    <tr>
-        <td></td>
-        <td>NOMOR RUAS</td>
-        <td width="10pt">:</td>
-        <td class="no-ruas"></td>
-        <td></td>
-    </tr>
-    <tr>
-        <td></td>
-        <td>NAMA RUAS</td>
-        <td width="10pt">:</td>
-        <td class="nama-ruas"></td>
-        <td></td>
-    </tr>
-    <tr>
-        <td></td>
-        <td>STA</td>
-        <td width="10pt">:</td>
-        <td class="sta"></td>
-        <td></td>
-    </tr>
-</table>
-'''
+# Lines kept in the log view, and the interval of adding new lines to it in ms
+LOG_LINES = 10000
+LOG_INTERVAL = 100
+# Delay of drawing the draft again after the last change of a setting, in ms
+DRAFT_DELAY = 500
 
 
 class Documentation(QWidget, Ui_Form):
     def __init__(self):
         super(Documentation, self).__init__()
         self.settings = QSettings(settings_filename, QSettings.IniFormat)
+        self.batch_thread = None
+        self.worker = None
+        self.preload_thread = None
+        self.scan_thread = None
+        self.scan_worker = None
+        self.scanned_dir = None
+        self.draft_thread = None
+        self.draft_worker = None
+        self.draft_pending = False
+        self.draft_dir = None
+        self.draft_timer = QTimer(self)
+        self.draft_timer.setSingleShot(True)
+        self.draft_timer.setInterval(DRAFT_DELAY)
+        self.draft_timer.timeout.connect(self.render_draft)
+        self.log_buffer = BufferHandler(LOG_LINES)
         self.setup_ui()
 
-        self.logger = create_logger(log_filename)
+        if '-v' in sys.argv or '--verbose' in sys.argv:
+            self.cb_logLevel.setCurrentText('DEBUG')
+        self.logger = create_logger(log_filename, self.cb_logLevel.currentText(), [self.log_buffer])
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_INTERVAL)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        QTimer.singleShot(0, self.window_shown)
 
     def setup_ui(self):
         self.setupUi(self)
 
-        paper_sizes = []
-
-        for attribute in dir(pagesizes):
-            if attribute.startswith('_'):
-                continue
-            if attribute in ['mm', 'inch', 'portrait', 'landscape', 'elevenSeventeen', 'legal', 'letter']:
-                continue
-            paper_sizes.append(attribute)
-
-        for paper_size in sorted(paper_sizes, key=lambda ps: re.sub(r'(\d+)', lambda m: '{:0>4}'.format(m.group(1)), ps)):
-            self.cb_paperSize.addItem(paper_size)
-
+        self.cb_paperSize.addItems(PAPER_SIZES)
         self.cb_paperSize.addItem('Custom')
         self.cb_paperOrientation.addItem('Portrait')
         self.cb_paperOrientation.addItem('Landscape')
@@ -266,6 +81,16 @@ class Documentation(QWidget, Ui_Form):
         self.le_mBottom.setValidator(QDoubleValidator(0, 10, 4, self))
         self.le_mLeft.setValidator(QDoubleValidator(0, 10, 4, self))
         self.le_mRight.setValidator(QDoubleValidator(0, 10, 4, self))
+        self.sb_workers.setRange(1, 4 * default_workers())
+        self.cb_engine.addItem('HTML (xhtml2pdf)', ENGINE_HTML)
+        self.cb_engine.addItem('Native (reportlab)', ENGINE_CANVAS)
+        self.cb_logLevel.addItems(LEVELS)
+        self.te_log.setMaximumBlockCount(LOG_LINES)
+        self.preview_model = PreviewModel(self)
+        self.tv_preview.setModel(self.preview_model)
+        self.tv_preview.setIconSize(THUMBNAIL_SIZE)
+        self.tv_preview.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tv_preview.header().setStretchLastSection(False)
 
         # TODO: Remove these lines to enable supervisor in footer
         self.le_supervisor.hide()
@@ -287,7 +112,34 @@ class Documentation(QWidget, Ui_Form):
         self.btn_output.clicked.connect(self.browse_output)
         self.cb_paperSize.currentTextChanged.connect(self.change_paper_size)
         self.btn_clearLog.clicked.connect(self.clear_log)
-        self.btn_start.clicked.connect(self.start)
+        self.cb_logLevel.currentTextChanged.connect(self.change_log_level)
+        self.btn_start.clicked.connect(lambda: self.start())
+        self.btn_resume.clicked.connect(lambda: self.start(resume=True))
+        self.btn_cancel.clicked.connect(self.cancel)
+        self.btn_scan.clicked.connect(self.scan_preview)
+        self.tab_output.currentChanged.connect(self.change_tab)
+        # Rows scrolled out of view no longer need their thumbnails
+        self.tv_preview.verticalScrollBar().valueChanged.connect(self.preview_model.cancel_pending)
+        self.btn_draft.clicked.connect(self.render_draft)
+        self.cb_draftRoad.currentIndexChanged.connect(self.request_draft)
+        self.sb_draftPages.valueChanged.connect(self.request_draft)
+        # Draw the draft again while the page settings are edited
+        for line_edit in (self.le_title, self.le_no_dist, self.le_no_lembar, self.le_paperWidth, self.le_paperHeight,
+                          self.le_mTop, self.le_mBottom, self.le_mLeft, self.le_mRight):
+            line_edit.textChanged.connect(self.request_draft)
+        self.cb_paperSize.currentTextChanged.connect(self.request_draft)
+        self.cb_paperOrientation.currentTextChanged.connect(self.request_draft)
+
+    def window_shown(self):
+        uptime = process_uptime()
+        if uptime is None:
+            uptime = time.perf_counter() - START_TIME
+        self.logger.info('# Window shown {:.2f} s after start'.format(uptime))
+        # Load the PDF stack while the user fills in the form
+        if self.is_running():
+            return
+        self.preload_thread = threading.Thread(target=renderer.preload, daemon=True)
+        self.preload_thread.start()
 
     def browse_source(self):
         source = QFileDialog.getExistingDirectory(self, 'Source')
@@ -298,10 +150,103 @@ class Documentation(QWidget, Ui_Form):
         self.le_output.setText(output)
 
     def clear_log(self):
+        self.log_buffer.take()
         self.te_log.clear()
 
-    def start(self):
+    def change_log_level(self, level):
+        set_level(level)
+
+    def change_tab(self, index):
+        if self.tab_output.widget(index) is self.tab_preview and self.scanned_dir != self.le_source.text():
+            self.scan_preview()
+        if self.tab_output.widget(index) is self.tab_draft:
+            self.list_draft_roads()
+            self.request_draft()
+
+    def scan_preview(self):
+        src_dir = self.le_source.text()
+        if self.scan_thread is not None or not (bool(src_dir) and os.path.isdir(src_dir)):
+            return
+        self.scanned_dir = src_dir
+        self.btn_scan.setEnabled(False)
+        self.lbl_preview.setText('Scanning...')
+        self.scan_worker = ScanWorker(src_dir)
+        self.scan_thread = QThread(self)
+        self.scan_worker.moveToThread(self.scan_thread)
+        self.scan_thread.started.connect(self.scan_worker.run)
+        self.scan_worker.error.connect(lambda error: self.write_log('# Error: ' + error))
+        self.scan_worker.finished.connect(self.scan_finished)
+        self.scan_thread.start()
+
+    def scan_finished(self, roads):
+        self.scan_thread.quit()
+        self.scan_thread.wait()
+        self.scan_thread = None
+        self.scan_worker = None
+        self.preview_model.set_roads(roads)
+        self.btn_scan.setEnabled(True)
+        photos = sum(len(photos) for _, photos in roads)
+        self.lbl_preview.setText('{} roads, {} photos'.format(len(roads), photos))
+
+    def list_draft_roads(self):
+        src_dir = self.le_source.text()
+        if self.draft_dir == src_dir or not (bool(src_dir) and os.path.isdir(src_dir)):
+            return
+        self.draft_dir = src_dir
+        current = self.cb_draftRoad.currentText()
+        self.cb_draftRoad.blockSignals(True)
+        self.cb_draftRoad.clear()
+        for road in sorted(list_roads(src_dir), key=os.path.basename):
+            if renderer.parse_road(road) is not None:
+                self.cb_draftRoad.addItem(os.path.basename(road), road)
+        self.cb_draftRoad.setCurrentIndex(max(self.cb_draftRoad.findText(current), 0))
+        self.cb_draftRoad.blockSignals(False)
+
+    def request_draft(self):
+        """Draw the draft after :data:`DRAFT_DELAY` without further changes, if the draft is shown."""
+        if self.tab_output.currentWidget() is self.tab_draft and self.cb_draftRoad.currentData():
+            self.draft_timer.start()
+
+    def render_draft(self):
+        road = self.cb_draftRoad.currentData()
+        if not road:
+            return
+        # Settings changed while drawing are drawn once the current draft is finished
+        if self.draft_thread is not None:
+            self.draft_pending = True
+            return
+        self.draft_timer.stop()
+        self.lbl_draft.setText('Drawing...')
+        self.draft_worker = DraftWorker(road, self.get_options(), self.sb_draftPages.value())
+        self.draft_thread = QThread(self)
+        self.draft_worker.moveToThread(self.draft_thread)
+        self.draft_thread.started.connect(self.draft_worker.run)
+        self.draft_worker.error.connect(lambda error: self.write_log('# Error: ' + error))
+        self.draft_worker.finished.connect(self.draft_finished)
+        self.draft_thread.start()
+
+    def draft_finished(self, image, seconds):
+        self.draft_thread.quit()
+        self.draft_thread.wait()
+        self.draft_thread = None
+        self.draft_worker = None
+        if image.isNull():
+            self.lbl_draft.setText('No draft')
+        else:
+            self.lbl_draftImage.setPixmap(QPixmap.fromImage(image))
+            if self.cb_engine.currentData() == ENGINE_CANVAS:
+                self.lbl_draft.setText('Drawn in {:.2f} s'.format(seconds))
+            else:
+                self.lbl_draft.setText('Drawn in {:.2f} s with the Native engine layout'.format(seconds))
+        if self.draft_pending:
+            self.draft_pending = False
+            self.render_draft()
+
+    def start(self, resume=False):
         self.freeze_ui(True)
+        # Worker processes are forked, they must not inherit the import lock of an unfinished preload
+        if self.preload_thread is not None:
+            self.preload_thread.join()
         src_dir = self.le_source.text()
         if not (bool(src_dir) and os.path.exists(src_dir)):
             QMessageBox.critical(self, 'Error', 'Invalid source directory')
@@ -315,141 +260,80 @@ class Documentation(QWidget, Ui_Form):
             return
 
         self.write_log('Processing source directory "{}"'.format(src_dir))
-
-        for basename in os.listdir(src_dir):
-            full_path = os.path.join(src_dir, basename)
-            if not os.path.isdir(full_path):
-                continue
-            self.write_log('# Current directory: ' + basename)
-            self.insert_picture(full_path, output)
-            self.write_log('==========\n')
-
+        self.pb_road.reset()
+        self.pb_overall.reset()
+
+        self.worker = BatchWorker(src_dir, output, self.get_options(), self.sb_workers.value(),
+                                  self.chk_incremental.isChecked(), metrics_filename, resume)
+        self.batch_thread = QThread(self)
+        self.worker.moveToThread(self.batch_thread)
+        self.batch_thread.started.connect(self.worker.run)
+        self.worker.log.connect(self.write_log)
+        self.worker.road_progress.connect(self.update_road_progress)
+        self.worker.overall_progress.connect(self.update_overall_progress)
+        self.worker.finished.connect(self.batch_finished)
+        self.btn_cancel.setEnabled(True)
+        self.batch_thread.start()
+
+    def cancel(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        self.btn_cancel.setEnabled(False)
+        self.write_log('# Cancelling after the current page...')
+
+    def is_running(self):
+        return self.batch_thread is not None and self.batch_thread.isRunning()
+
+    def update_road_progress(self, basename, value, maximum):
+        self.pb_road.setFormat('{} - %p%'.format(basename))
+        self.pb_road.setMaximum(maximum)
+        self.pb_road.setValue(value)
+
+    def update_overall_progress(self, value, maximum):
+        self.pb_overall.setFormat('%v / %m roads')
+        self.pb_overall.setMaximum(maximum)
+        self.pb_overall.setValue(value)
+
+    def batch_finished(self, results):
+        self.batch_thread.quit()
+        self.batch_thread.wait()
+        self.batch_thread = None
+        self.worker = None
+        self.btn_cancel.setEnabled(False)
         self.freeze_ui(False)
 
-    def convert_to_pdf(self, content, output):
-        self.write_log('# Writing PDF: ' + output)
-        try:
-            with open(output, 'wb') as fp:
-                pisa_status = pisa.CreatePDF(content, dest=fp)
-
-            self.write_log('Done!')
-            return pisa_status.err
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
-            return 1
-
-    def get_header(self, no_ruas, page_number):
-        no_distribusi = self.le_no_dist.text().strip()
-        no_leger = self.le_no_lembar.text()
-
-        def replace_no_leger(match):
-            return match.group(1) + str(no_ruas) + match.group(3) + '{:0>3}'.format(page_number) + match.group(5)
-        no_leger = re.sub(r'^(\d{2} )(\d{3})( .{2} \w )(\d{3})( \d)$', replace_no_leger, no_leger)
-
-        header_soup = BeautifulSoup(header_template, 'lxml')
-        header_soup.find(class_='logo')['src'] = 'file:///' + logo.replace('\\', '/')
-        header_soup.find(class_='title').string = self.le_title.text()
-        tr_no_distribusi = header_soup.find('tr', class_='no-distribusi')
-        tr_no_leger = header_soup.find('tr', class_='no-leger')
-
-        for n in no_distribusi:
-            td = header_soup.new_tag('td')
-            if n == ' ':
-                td['class'] = 'separator'
-            else:
-                td['class'] = 'box'
-                td.string = n
-            tr_no_distribusi.append(td)
-
-        for n in no_leger:
-            td = header_soup.new_tag('td')
-            if n == ' ':
-                td['class'] = 'separator'
-            else:
-                td['class'] = 'box'
-                td.string = n
-            tr_no_leger.append(td)
-        return header_soup
-
-    def insert_picture(self, src_dir, output_dir):
-        basename = os.path.basename(src_dir)
-        parts = re.split(r' ?- ?', basename)
-        if len(parts) != 2:
-            print('Invalid directory', basename)
-            return
-        no_ruas, nm_ruas = parts
-
-        pictures = []
-        for filetype in ['*.jpg', '*.jpeg', '*.png']:
-            pictures.extend(
-                glob(os.path.join(src_dir, '**', 'STA ' + filetype), recursive=True))
-
-        pictures = sorted(pictures, key=lambda f: os.path.basename(f))
-        paper_size = self.cb_paperSize.currentText().lower()
-        if paper_size == 'custom':
-            page_size = '{}cm {}cm'.format(
-                self.le_paperWidth.text(), self.le_paperWidth.text())
-        else:
-            page_size = '{} {}'.format(
-                paper_size, self.cb_paperOrientation.currentText().lower())
-        template_content = template
-        template_content = template_content.replace(
-            '[PAGE_SIZE]', page_size)
-        template_content = template_content.replace(
-            '[MARGIN_TOP]', self.le_mTop.text() + 'cm')
-        template_content = template_content.replace(
-            '[MARGIN_BOTTOM]', self.le_mBottom.text() + 'cm')
-        template_content = template_content.replace(
-            '[MARGIN_LEFT]', self.le_mLeft.text() + 'cm')
-        template_content = template_content.replace(
-            '[MARGIN_RIGHT]', self.le_mRight.text() + 'cm')
-        soup = BeautifulSoup(template_content, 'lxml')
-
-        soup.find(id='supervisor').string = '( {} )'.format(
-            self.le_supervisor.text())
-
-        self.write_log('# Pictures found: ' + str(len(pictures)))
-
-        header_soup = None
-        table_soup = None
-        page_number = 1
-        for i, pic_path in enumerate(pictures):
-            cell_idx = i % 6
-            if cell_idx == 0:
-                if header_soup is not None:
-                    soup.body.append(header_soup)
-                if table_soup is not None:
-                    soup.body.append(table_soup)
-                header_soup = self.get_header(no_ruas, page_number)
-                table_soup = BeautifulSoup(table_template, 'lxml')
-                page_number += 1
-            pic_soup = BeautifulSoup(picture_template, 'lxml')
-            pic_soup.find('img')['src'] = 'file:///' + \
-                pic_path.replace('\\', '/')
-            pic_soup.find('td', class_='no-ruas').string = no_ruas
-            pic_soup.find('td', class_='nama-ruas').string = nm_ruas
-            sta = ''
-            sta_suffix = ''
-            m_sta = re.match(r'STA ([\d+]+) *(KIRI|KANAN)*.*', os.path.basename(pic_path))
-            if m_sta:
-                sta = m_sta.group(1) or ''
-                sta_suffix = m_sta.group(2) or ''
-            pic_dir = os.path.basename(os.path.dirname(pic_path)).upper()
-            if pic_dir == 'KIRI' or pic_dir == 'KANAN':
-                sta_suffix = pic_dir
-            pic_soup.find('td', class_='sta').string = ' '.join([sta, sta_suffix])
-            table_soup.find('td', class_='cell-' +
-                            str(cell_idx)).append(pic_soup)
-        if header_soup is not None:
-            soup.body.append(header_soup)
-        if table_soup is not None:
-            soup.body.append(table_soup)
-
-        # TODO: Remove this lines to show footer
-        soup.find(id='footer_content').clear()
-
-        output = os.path.join(output_dir, '{}.pdf'.format(os.path.basename(src_dir)))
-        self.convert_to_pdf(str(soup), output=output.replace('\\', '/'))
+        skipped = [result for result in results if result.status == SKIPPED]
+        if skipped:
+            self.write_log('# Skipped {} unchanged road(s)'.format(len(skipped)))
+        cancelled = [result for result in results if result.status == CANCELLED]
+        if cancelled:
+            self.write_log('# Cancelled, {} road(s) not rendered'.format(len(cancelled)))
+        errors = ['{}: {}'.format(result.road, result.error) for result in results if result.error]
+        if errors:
+            QMessageBox.critical(self, 'Error', '\n'.join(errors))
+
+    def get_options(self):
+        return {
+            'title': self.le_title.text(),
+            'no_distribusi': self.le_no_dist.text(),
+            'no_leger': self.le_no_lembar.text(),
+            'supervisor': self.le_supervisor.text(),
+            'paper_size': self.cb_paperSize.currentText(),
+            'paper_orientation': self.cb_paperOrientation.currentText(),
+            'paper_width': self.le_paperWidth.text(),
+            'paper_height': self.le_paperHeight.text(),
+            'margin_top': self.le_mTop.text(),
+            'margin_bottom': self.le_mBottom.text(),
+            'margin_left': self.le_mLeft.text(),
+            'margin_right': self.le_mRight.text(),
+            'dpi': self.sb_dpi.value(),
+            'engine': self.cb_engine.currentData(),
+            'chunk_pages': self.sb_chunkPages.value(),
+            'chunk_workers': max(1, default_workers() // self.sb_workers.value()),
+            'profile_dir': profile_dir if '--profile' in sys.argv else '',
+            'memory_limit': self.sb_memoryLimit.value(),
+        }
 
     def load_settings(self):
         geometry = self.settings.value('Ui/Geometry')
@@ -471,9 +355,18 @@ class Documentation(QWidget, Ui_Form):
         self.le_mBottom.setText(self.settings.value('Margin/Bottom'))
         self.le_mLeft.setText(self.settings.value('Margin/Left'))
         self.le_mRight.setText(self.settings.value('Margin/Right'))
+        self.sb_workers.setValue(int(self.settings.value('Process/Workers', default_workers())))
+        self.sb_dpi.setValue(int(self.settings.value('Process/PhotoDPI', 150)))
+        self.chk_incremental.setChecked(self.settings.value('Process/SkipUnchanged', 'true') == 'true')
+        engine_idx = self.cb_engine.findData(self.settings.value('Process/Engine', ENGINE_HTML))
+        self.cb_engine.setCurrentIndex(max(engine_idx, 0))
+        self.sb_chunkPages.setValue(int(self.settings.value('Process/ChunkPages', 0)))
+        self.sb_memoryLimit.setValue(int(self.settings.value('Process/MemoryLimit', 0)))
+        self.cb_logLevel.setCurrentText(self.settings.value('Ui/LogLevel', 'INFO'))
 
     def save_settings(self):
         self.settings.setValue('Ui/Geometry', self.saveGeometry())
+        self.settings.setValue('Ui/LogLevel', self.cb_logLevel.currentText())
         self.settings.setValue('Input/Source', self.le_source.text())
         self.settings.setValue('Input/Output', self.le_output.text())
         self.settings.setValue('Input/Title', self.le_title.text())
@@ -489,6 +382,12 @@ class Documentation(QWidget, Ui_Form):
         self.settings.setValue('Margin/Bottom', self.le_mBottom.text())
         self.settings.setValue('Margin/Left', self.le_mLeft.text())
         self.settings.setValue('Margin/Right', self.le_mRight.text())
+        self.settings.setValue('Process/Workers', self.sb_workers.value())
+        self.settings.setValue('Process/PhotoDPI', self.sb_dpi.value())
+        self.settings.setValue('Process/SkipUnchanged', self.chk_incremental.isChecked())
+        self.settings.setValue('Process/Engine', self.cb_engine.currentData())
+        self.settings.setValue('Process/ChunkPages', self.sb_chunkPages.value())
+        self.settings.setValue('Process/MemoryLimit', self.sb_memoryLimit.value())
 
     def freeze_ui(self, freeze: bool):
         self.le_source.setDisabled(freeze)
@@ -499,8 +398,14 @@ class Documentation(QWidget, Ui_Form):
         self.le_supervisor.setDisabled(freeze)
         self.gb_paperSize.setDisabled(freeze)
         self.gb_margins.setDisabled(freeze)
+        self.sb_workers.setDisabled(freeze)
+        self.sb_dpi.setDisabled(freeze)
+        self.cb_engine.setDisabled(freeze)
+        self.sb_chunkPages.setDisabled(freeze)
+        self.sb_memoryLimit.setDisabled(freeze)
+        self.chk_incremental.setDisabled(freeze)
         self.btn_start.setDisabled(freeze)
-        QApplication.processEvents()
+        self.btn_resume.setDisabled(freeze)
 
     def change_paper_size(self, paper_size):
         is_custom = paper_size.lower() == 'custom'
@@ -516,22 +421,48 @@ class Documentation(QWidget, Ui_Form):
             self.le_paperHeight.clear()
 
     def write_log(self, log):
-        self.te_log.appendPlainText(log)
-        self.te_log.ensureCursorVisible()
-        QApplication.processEvents()
-        self.logger.info(log)
+        """Log a message. It is written to the file by the logging thread and
+        added to the log view by :meth:`flush_log`."""
+        self.logger.log(logging.ERROR if '# Error' in log else logging.INFO, log)
+
+    def flush_log(self):
+        messages = self.log_buffer.take()
+        if not messages:
+            return
+        scroll_bar = self.te_log.verticalScrollBar()
+        at_end = scroll_bar.value() == scroll_bar.maximum()
+        self.te_log.appendPlainText('\n'.join(messages))
+        # Keep the position when the user scrolled up to read
+        if at_end:
+            scroll_bar.setValue(scroll_bar.maximum())
 
     def closeEvent(self, event):
         reply = QMessageBox.question(self, 'Keluar', 'Keluar aplikasi?')
 
         if reply == QMessageBox.Yes:
+            if self.is_running():
+                self.worker.cancel()
+                self.batch_thread.quit()
+                self.batch_thread.wait()
+            if self.scan_thread is not None:
+                self.scan_thread.quit()
+                self.scan_thread.wait()
+            self.draft_timer.stop()
+            self.draft_pending = False
+            if self.draft_thread is not None:
+                self.draft_thread.quit()
+                self.draft_thread.wait()
+            self.preview_model.cancel_pending()
+            self.preview_model.pool.waitForDone()
             self.save_settings()
+            shutdown_logger()
             event.accept()
         else:
             event.ignore()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     doc = Documentation()
     sys.exit(app.exec_())
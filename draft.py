@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Low resolution draft of the first pages of a road.
+
+    python draft.py "path/to/001 - NAMA RUAS" draft.png --pages 2
+
+The draft paints the :mod:`layout` of the pages, the geometry the native
+engine draws into the PDF, onto an image with Qt instead of building a PDF.
+With the HTML engine the draft is an approximation, xhtml2pdf may place the
+photos and captions a little differently.
+Photos are decoded at the size they are shown, so a draft of a few pages is
+ready in about a second to check the title, numbering, margins and captions.
+"""
+
+import argparse
+import sys
+import time
+
+from PyQt5.QtCore import QPointF, QRectF, QSize, Qt
+from PyQt5.QtGui import QColor, QFont, QFontMetricsF, QGuiApplication, QImage, QImageIOHandler, QImageReader, \
+    QPainter, QPen
+
+import canvas_renderer
+import layout
+import renderer
+
+DRAFT_DPI = 50
+DRAFT_PAGES = 2
+# Space around and between the pages of a draft, in pixels
+PAGE_SPACING = 12
+BACKGROUND = QColor(128, 128, 128)
+MARGIN_COLOR = QColor(120, 170, 230)
+
+# Pages are painted in points, the images are marked as 72 dpi so fonts are sized in points too
+DOTS_PER_METER = round(72 / 0.0254)
+
+FONTS = {
+    layout.FONT: ('Helvetica', False),
+    layout.FONT_BOLD: ('Helvetica', True),
+}
+
+
+def get_font(name, size):
+    family, bold = FONTS[name]
+    font = QFont(family)
+    font.setStyleHint(QFont.SansSerif)
+    font.setPointSizeF(size)
+    font.setBold(bold)
+    return font
+
+
+def load_image(filename, width, height):
+    """Decode an image scaled down to fit ``width`` x ``height`` pixels,
+    returns a null ``QImage`` on errors. JPEGs are decoded at the reduced
+    size straight away."""
+    reader = QImageReader(filename)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid():
+        target = QSize(max(1, round(width)), max(1, round(height)))
+        # The scaled size applies before the EXIF rotation
+        if reader.transformation() & QImageIOHandler.TransformationRotate90:
+            target.transpose()
+        if size.width() > target.width() or size.height() > target.height():
+            reader.setScaledSize(size.scaled(target, Qt.KeepAspectRatio))
+    return reader.read()
+
+
+def draw_image(painter, image, rect, scale, anchor='n'):
+    """Draw ``image`` into ``rect`` keeping its aspect ratio, at the top
+    center or, with ``anchor='nw'``, the top left corner of ``rect``."""
+    image = load_image(image, rect.width * scale, rect.height * scale)
+    if image.isNull():
+        painter.fillRect(QRectF(rect.x, rect.y, rect.width, rect.height), Qt.lightGray)
+        return
+    ratio = min(rect.width / image.width(), rect.height / image.height())
+    width = image.width() * ratio
+    x = rect.x if anchor == 'nw' else rect.x + (rect.width - width) / 2
+    painter.drawImage(QRectF(x, rect.y, width, image.height() * ratio), image)
+
+
+def draw_text(painter, text):
+    font = get_font(text.font, text.size)
+    painter.setFont(font)
+    x = text.x
+    if text.align == 'center':
+        x -= QFontMetricsF(font, painter.device()).horizontalAdvance(text.text) / 2
+    painter.drawText(QPointF(x, text.y), text.text)
+
+
+def draw_page(page, logo_src, sources, margins=None, dpi=DRAFT_DPI):
+    """Paint a :class:`layout.PageLayout` and return it as a ``QImage``.
+
+    ``margins`` is a :class:`layout.Rect` of the area inside the margins,
+    outlined when given.
+    """
+    scale = dpi / 72
+    image = QImage(max(1, round(page.width * scale)), max(1, round(page.height * scale)), QImage.Format_RGB32)
+    image.setDotsPerMeterX(DOTS_PER_METER)
+    image.setDotsPerMeterY(DOTS_PER_METER)
+    image.fill(Qt.white)
+
+    painter = QPainter(image)
+    try:
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform)
+        painter.scale(scale, scale)
+        if margins is not None:
+            painter.setPen(QPen(MARGIN_COLOR, 0, Qt.DashLine))
+            painter.drawRect(QRectF(margins.x, margins.y, margins.width, margins.height))
+
+        draw_image(painter, logo_src, page.logo, scale, anchor='nw')
+        painter.setPen(QPen(Qt.black, 1))
+        for text in page.texts:
+            draw_text(painter, text)
+        for box in page.boxes:
+            rect = box.rect
+            painter.drawRect(QRectF(rect.x, rect.y, rect.width, rect.height))
+            draw_text(painter, layout.Text(rect.x + rect.width / 2, rect.y + layout.BOX_BASELINE, layout.FONT_BOLD,
+                                           layout.BOX_FONT_SIZE, box.text, 'center'))
+        for cell, src in zip(page.cells, sources):
+            draw_image(painter, src, cell.image, scale)
+            for text in cell.captions:
+                draw_text(painter, text)
+    finally:
+        painter.end()
+    return image
+
+
+def stack_pages(pages):
+    """Return one image with ``pages`` below each other on a gray background."""
+    width = max(page.width() for page in pages) + 2 * PAGE_SPACING
+    height = sum(page.height() for page in pages) + (len(pages) + 1) * PAGE_SPACING
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(BACKGROUND)
+    painter = QPainter(image)
+    y = PAGE_SPACING
+    for page in pages:
+        painter.drawImage((width - page.width()) // 2, y, page)
+        y += page.height() + PAGE_SPACING
+    painter.end()
+    return image
+
+
+def get_margins(options):
+    page_width, page_height = renderer.get_page_dimensions(options)
+    left = renderer.to_cm(options['margin_left']) * layout.CM
+    top = renderer.to_cm(options['margin_top']) * layout.CM
+    right = page_width * layout.CM - renderer.to_cm(options['margin_right']) * layout.CM
+    bottom = page_height * layout.CM - renderer.to_cm(options['margin_bottom']) * layout.CM
+    return layout.Rect(left, top, right - left, bottom - top)
+
+
+def render_draft(src_dir, options, pages=DRAFT_PAGES, dpi=DRAFT_DPI, pictures=None):
+    """Draw the first ``pages`` pages of a road folder at ``dpi`` and return
+    them stacked in one ``QImage``.
+
+    ``pictures`` are the photo records of the road, found when not given.
+    Only the photos of the drawn pages are read. Raises ``ValueError`` if
+    the folder is not a road or has no photos.
+    """
+    road = renderer.parse_road(src_dir)
+    if road is None:
+        raise ValueError('Invalid road folder: ' + src_dir)
+    no_ruas, nm_ruas = road
+    if pictures is None:
+        pictures = renderer.find_pictures(src_dir)
+    pictures = pictures[:pages * 6]
+    if not pictures:
+        raise ValueError('No photos in ' + src_dir)
+
+    margins = get_margins(options)
+    images = []
+    for page_idx in range(0, len(pictures), 6):
+        page_pictures = pictures[page_idx:page_idx + 6]
+        captions = [(no_ruas, nm_ruas, renderer.get_sta(photo)) for photo in page_pictures]
+        page = canvas_renderer.get_layout(options, no_ruas, page_idx // 6 + 1, captions)
+        images.append(draw_page(page, renderer.logo, [photo.path for photo in page_pictures], margins, dpi))
+    return stack_pages(images)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Draw a low resolution draft of the first pages of a road.')
+    parser.add_argument('road', help='road folder, e.g. "001 - NAMA RUAS"')
+    parser.add_argument('output', help='image file, e.g. draft.png')
+    parser.add_argument('--pages', type=int, default=DRAFT_PAGES,
+                        help='number of pages (default: {})'.format(DRAFT_PAGES))
+    parser.add_argument('--dpi', type=int, default=DRAFT_DPI, help='resolution (default: {})'.format(DRAFT_DPI))
+    parser.add_argument('--title', default='DOKUMENTASI', help='document title')
+    args = parser.parse_args(argv)
+
+    # Text is drawn with the fonts of the platform
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])  # noqa: F841
+    options = dict(renderer.DEFAULT_OPTIONS, title=args.title)
+    start = time.perf_counter()
+    try:
+        image = render_draft(args.road, options, args.pages, args.dpi)
+    except (OSError, ValueError) as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        return 2
+    if not image.save(args.output):
+        print('Error: Cannot write ' + args.output, file=sys.stderr)
+        return 1
+    print('Draft drawn in {:.2f} s'.format(time.perf_counter() - start))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
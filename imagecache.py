@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+
+from PIL import Image
+
+
+def get_default_cache_dir():
+    """Return the per-user cache folder of the resampled photos."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'documentation')
+
+
+default_cache_dir = get_default_cache_dir()
+
+CM_PER_INCH = 2.54
+
+# Prepared copies are upright since version 2, older copies are not reused
+CACHE_VERSION = 2
+
+# Extensions of the files reportlab embeds without decoding them
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# EXIF orientation tag, the transpositions that show an image upright and the
+# orientations that swap its width and height
+TAG_ORIENTATION = 0x0112
+TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+ROTATED = (5, 6, 7, 8)
+
+
+def file_hash(filename, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pixels(length_cm, dpi):
+    return max(1, int(round(length_cm / CM_PER_INCH * dpi)))
+
+
+def is_jpeg(filename):
+    return os.path.splitext(filename)[1].lower() in JPEG_EXTENSIONS
+
+
+def get_orientation(image):
+    """Return the EXIF orientation of an opened image, 1 if it has none."""
+    try:
+        orientation = image.getexif().get(TAG_ORIENTATION, 1)
+    except (OSError, ValueError, SyntaxError):
+        return 1
+    return orientation if orientation in TRANSPOSE else 1
+
+
+def read_orientation(filename):
+    """Return ``(orientation, width, height)`` of an image file, the size
+    as stored. Only the header is read."""
+    with Image.open(filename) as image:
+        return (get_orientation(image),) + image.size
+
+
+def prepare_picture(filename, width, cache_dir=default_cache_dir, digest=None, upright=True):
+    """Return a copy of ``filename`` resampled to at most ``width`` pixels wide.
+
+    The copy is stored in ``cache_dir`` under the content hash of the original
+    and the target width, so unchanged photos are only resampled once. The
+    copy is turned upright according to the EXIF orientation of the photo.
+    Photos that are already small enough are returned as is, unless they
+    have an orientation and ``upright`` is set, e.g. for renderers that
+    cannot rotate them. ``digest`` is the content hash when it is already
+    known.
+    """
+    _, ext = os.path.splitext(filename)
+    ext = '.png' if ext.lower() == '.png' else '.jpg'
+    cached = os.path.join(cache_dir, '{}_{}_v{}{}'.format(digest or file_hash(filename), width, CACHE_VERSION, ext))
+    if os.path.exists(cached):
+        return cached, True
+
+    with Image.open(filename) as image:
+        orientation = get_orientation(image)
+        upright_width, upright_height = image.size
+        if orientation in ROTATED:
+            upright_width, upright_height = upright_height, upright_width
+        if upright_width <= width:
+            if orientation == 1 or not upright:
+                return filename, False
+            resized = image.copy()
+        else:
+            height = max(1, int(round(upright_height * width / upright_width)))
+            resized = image.resize((height, width) if orientation in ROTATED else (width, height), Image.LANCZOS)
+    if orientation != 1:
+        resized = resized.transpose(TRANSPOSE[orientation])
+
+    if ext == '.jpg' and resized.mode not in ('RGB', 'L', 'CMYK'):
+        resized = resized.convert('RGB')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_filename = tempfile.mkstemp(suffix=ext, dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            if ext == '.jpg':
+                resized.save(fp, 'JPEG', quality=85, optimize=True)
+            else:
+                resized.save(fp, 'PNG', optimize=True)
+        os.replace(tmp_filename, cached)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return cached, False
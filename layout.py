@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Page geometry of the photo documentation, shared by the native renderers.
+
+All values are in points, measured from the top left corner of the page. The
+offsets reproduce where xhtml2pdf places the elements of the HTML templates,
+so both engines produce the same page.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from reportlab.lib.utils import simpleSplit
+
+CM = 72 / 2.54
+
+Rect = namedtuple('Rect', ['x', 'y', 'width', 'height'])
+Text = namedtuple('Text', ['x', 'y', 'font', 'size', 'text', 'align'], defaults=['left'])
+Box = namedtuple('Box', ['rect', 'text'])
+Cell = namedtuple('Cell', ['image', 'captions'])
+PageLayout = namedtuple('PageLayout', ['width', 'height', 'logo', 'texts', 'boxes', 'cells'])
+
+FONT = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+
+# Header, relative to the top margin
+LOGO_WIDTH = 34.0
+LOGO_COLUMN = 1.6 * CM
+AGENCY_LINES = (
+    (10.05, FONT_BOLD, 14, 'PEMERINTAH KOTA JAMBI'),
+    (28.89, FONT_BOLD, 11, 'DINAS PEKERJAAN UMUM DAN PENATAAN RUANG'),
+    (43.24, FONT, 8, 'ALAMAT: JL. H. ZAINIR HAVIZ NO. 04, KEC. KOTABARU JAMBI TELP. 40553'),
+)
+TITLE_BASELINE = 24.17
+TITLE_SIZE = 18
+SIDE_COLUMN = 0.3
+NO_DISTRIBUSI_LABEL = (8.43, 'NOMOR DISTRIBUSI KE')
+NO_DISTRIBUSI_TOP = 0.75
+NO_LEGER_LABEL = (24.93, 'NOMOR LEMBAR KARTU LEGER JALAN:')
+NO_LEGER_TOP = 32.75
+LABEL_SIZE = 10
+BOX_WIDTH = 18
+BOX_HEIGHT = 16
+BOX_SEPARATOR = 6
+BOX_BASELINE = 9.56
+BOX_FONT_SIZE = 8.25
+
+# Photo grid
+GRID_TOP = 63.65
+CELL_SPACING = 1 * CM
+IMAGE_RATIO = 0.75
+CAPTION_TOP = 17.41
+CAPTION_LINE = 11.25
+CAPTION_SIZE = 7.5
+CAPTION_COLON_WIDTH = 10
+ROW_GAP = 57.8
+CAPTION_LABELS = ('NOMOR RUAS', 'NAMA RUAS', 'STA')
+
+
+def get_boxes(text, right, top):
+    """Lay out one character box per character of ``text``, right aligned."""
+    widths = [BOX_SEPARATOR if n == ' ' else BOX_WIDTH for n in text]
+    x = right - sum(widths)
+    boxes = []
+    for n, width in zip(text, widths):
+        if n != ' ':
+            boxes.append(Box(Rect(x, top, width, BOX_HEIGHT), n))
+        x += width
+    return boxes
+
+
+@lru_cache(maxsize=256)
+def wrap_value(value, width):
+    """Return the lines of a caption value wrapped at the spaces to ``width``,
+    like xhtml2pdf wraps it in the value column. Longer words are not split."""
+    return tuple(simpleSplit(value, FONT, CAPTION_SIZE, width)) or ('',)
+
+
+def get_caption_lines(width, values):
+    """Return the wrapped lines of the caption values of a photo ``width`` wide."""
+    column = (width - CAPTION_COLON_WIDTH) / 4
+    return [wrap_value(value, column) for value in values]
+
+
+def get_captions(image, lines):
+    """Lay out the captions below ``image``, ``lines`` are the wrapped values
+    of :func:`get_caption_lines`. The label and colon of a wrapped value are
+    centered on its lines."""
+    column = (image.width - CAPTION_COLON_WIDTH) / 4
+    label_x = image.x + column
+    colon_x = image.x + 2 * column
+    value_x = colon_x + CAPTION_COLON_WIDTH
+    texts = []
+    y = image.y + image.height + CAPTION_TOP
+    for label, value_lines in zip(CAPTION_LABELS, lines):
+        middle = y + (len(value_lines) - 1) * CAPTION_LINE / 2
+        texts.append(Text(label_x, middle, FONT, CAPTION_SIZE, label))
+        texts.append(Text(colon_x, middle, FONT, CAPTION_SIZE, ':'))
+        for line in value_lines:
+            texts.append(Text(value_x, y, FONT, CAPTION_SIZE, line))
+            y += CAPTION_LINE
+    return texts
+
+
+def get_page_layout(page_width, page_height, margin_top, margin_left, margin_right,
+                    title, no_distribusi, no_leger, captions):
+    """Return the :class:`PageLayout` of one page.
+
+    ``captions`` holds one ``(no_ruas, nm_ruas, sta)`` tuple per photo on the
+    page, at most six. Margins are in points.
+    """
+    left = margin_left
+    right = page_width - margin_right
+    top = margin_top
+    content_width = right - left
+
+    texts = [Text(left + LOGO_COLUMN, top + y, font, size, text) for y, font, size, text in AGENCY_LINES]
+    side_width = SIDE_COLUMN * content_width
+    texts.append(Text(left + content_width / 2, top + TITLE_BASELINE, FONT_BOLD, TITLE_SIZE, title, 'center'))
+    label_x = right - side_width
+    texts.append(Text(label_x, top + NO_DISTRIBUSI_LABEL[0], FONT_BOLD, LABEL_SIZE, NO_DISTRIBUSI_LABEL[1]))
+    texts.append(Text(label_x, top + NO_LEGER_LABEL[0], FONT_BOLD, LABEL_SIZE, NO_LEGER_LABEL[1]))
+    boxes = get_boxes(no_distribusi, right, top + NO_DISTRIBUSI_TOP) + get_boxes(no_leger, right, top + NO_LEGER_TOP)
+
+    cell_width = (content_width - 2 * CELL_SPACING) / 3
+    image_height = cell_width * IMAGE_RATIO
+    lines = [get_caption_lines(cell_width, values) for values in captions[:6]]
+    # Wrapped values make the captions and the row taller, the next row starts below the tallest captions
+    extra_lines = [max(sum(len(value_lines) - 1 for value_lines in cell_lines) for cell_lines in lines[idx:idx + 3])
+                   for idx in range(0, len(lines), 3)]
+    cells = []
+    for cell_idx, cell_lines in enumerate(lines):
+        row, column = divmod(cell_idx, 3)
+        image = Rect(left + column * (cell_width + CELL_SPACING),
+                     top + GRID_TOP + row * (image_height + ROW_GAP) + sum(extra_lines[:row]) * CAPTION_LINE,
+                     cell_width, image_height)
+        cells.append(Cell(image, get_captions(image, cell_lines)))
+
+    logo = Rect(left, top, LOGO_WIDTH, LOGO_COLUMN)
+    return PageLayout(page_width, page_height, logo, texts, boxes, cells)
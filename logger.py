@@ -1,15 +1,93 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+# Size of a log file before it is rotated, and the number of old files kept
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
 
-def create_logger(filename: str):
-    logging.basicConfig(filename=filename, filemode='w',
-                        format='%(asctime)s [%(levelname)s]: %(message)s', level=logging.WARNING)
-    logger = logging.getLogger()
+_listener = None
+_file_handler = None
+
+
+class BufferHandler(logging.Handler):
+    """Collects formatted messages for a consumer that takes them in batches,
+    like the log view of the GUI."""
+
+    def __init__(self, maxlen=None):
+        super(BufferHandler, self).__init__()
+        self.messages = collections.deque(maxlen=maxlen)
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+    def take(self):
+        """Return and forget the collected messages."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.popleft())
+            except IndexError:
+                return messages
+
+
+def create_logger(filename: str, level=None, handlers=(), max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """Log to ``filename`` and ``handlers`` from a background thread.
 
-    if '-v' in sys.argv or '--verbose' in sys.argv:
-        logger.setLevel(logging.DEBUG)
+    Records are put on a queue by the calling thread and written by a
+    ``QueueListener``, so logging never waits for the disk. The file is
+    rotated when it exceeds ``max_bytes`` and at every start, keeping
+    ``backup_count`` old files. ``level`` is the level of the file, see
+    :func:`set_level`, and defaults to DEBUG with ``-v`` and INFO otherwise.
+    """
+    global _listener, _file_handler
+    shutdown_logger()
 
+    file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                                        encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s]: %(message)s'))
+    if os.path.exists(filename) and os.path.getsize(filename) > 0:
+        file_handler.doRollover()
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    if level is None:
+        level = logging.DEBUG if '-v' in sys.argv or '--verbose' in sys.argv else logging.INFO
+    _file_handler = file_handler
+    set_level(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, *handlers, respect_handler_level=True)
+    _listener.start()
     return logger
+
+
+def set_level(level):
+    """Write records of ``level`` and above to the log file.
+
+    The other handlers keep receiving every INFO record, and DEBUG records
+    too while the file takes them.
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level)
+    logging.getLogger().setLevel(min(level, logging.INFO))
+    if _file_handler is not None:
+        _file_handler.setLevel(level)
+
+
+def shutdown_logger():
+    """Write the queued records and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
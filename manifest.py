@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+
+MANIFEST_FILENAME = 'documentation-manifest.json'
+MANIFEST_VERSION = 1
+JOURNAL_FILENAME = 'documentation-journal.json'
+
+# Options that do not change the rendered PDF
+IGNORED_OPTIONS = ('cache_dir', 'chunk_pages', 'chunk_workers', 'profile_dir', 'memory_limit',
+                   'catalog', 'pipeline_workers', 'pipeline_depth')
+
+
+def get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Permissions of the written files, mkstemp creates them readable by the owner only
+FILE_MODE = 0o666 & ~get_umask()
+
+
+def manifest_path(output_dir):
+    return os.path.join(output_dir, MANIFEST_FILENAME)
+
+
+def load_manifest(output_dir):
+    """Return the road entries recorded in ``output_dir``, keyed by folder name."""
+    try:
+        with open(manifest_path(output_dir), 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('roads', {})
+
+
+def save_manifest(output_dir, roads):
+    write_json(manifest_path(output_dir), {'version': MANIFEST_VERSION, 'roads': roads})
+
+
+def write_json(filename, data):
+    """Write ``data`` to ``filename`` through a temporary file, so readers never see half of it."""
+    fd, tmp_filename = tempfile.mkstemp(suffix='.json', dir=os.path.dirname(filename))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, sort_keys=True)
+        os.chmod(tmp_filename, FILE_MODE)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def journal_path(output_dir):
+    return os.path.join(output_dir, JOURNAL_FILENAME)
+
+
+def load_journal(output_dir):
+    """Return the journal of the batch that was interrupted in ``output_dir``, or None.
+
+    The journal holds the ``source`` folder, the names of its ``roads`` and
+    of the roads that were ``finished``.
+    """
+    try:
+        with open(journal_path(output_dir), 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return None
+    return data
+
+
+def save_journal(output_dir, source, roads, finished):
+    write_json(journal_path(output_dir), {'version': MANIFEST_VERSION, 'source': source,
+                                          'roads': roads, 'finished': finished})
+
+
+def clear_journal(output_dir):
+    try:
+        os.remove(journal_path(output_dir))
+    except FileNotFoundError:
+        pass
+
+
+def road_inputs(src_dir, pictures, options):
+    """Describe everything a road PDF is built from."""
+    photos = []
+    for photo in pictures:
+        photos.append([os.path.relpath(photo.path, src_dir).replace('\\', '/'),
+                       photo.size, photo.mtime_ns])
+    settings = {key: value for key, value in options.items() if key not in IGNORED_OPTIONS}
+    return {'settings': settings, 'photos': photos}
+
+
+def output_state(output):
+    try:
+        stat = os.stat(output)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def make_entry(inputs, output):
+    entry = dict(inputs)
+    entry['output'] = output_state(output)
+    return entry
+
+
+def is_up_to_date(entry, inputs, output):
+    """Return True if ``output`` was built from ``inputs`` and is still intact."""
+    if not entry or entry.get('output') is None:
+        return False
+    return (entry.get('settings') == inputs['settings']
+            and entry.get('photos') == inputs['photos']
+            and entry['output'] == output_state(output))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Per-road timing and resource metrics, written as JSON lines."""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+METRICS_VERSION = 2
+
+
+class Metrics:
+    """Wall time per stage and counters of one road.
+
+    Stages can be nested; the time of a nested stage is not counted again in
+    the stage around it, so the stages add up to the total.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.values = {}
+        self._nested = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(name, elapsed - self._nested.pop())
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def record(self, **fields):
+        """Return the metrics as a dict that can be written with :func:`write_record`."""
+        record = {'version': METRICS_VERSION, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        record.update(fields)
+        record.update(self.values)
+        record['stages'] = {name: round(seconds, 6) for name, seconds in self.stages.items()}
+        record['total'] = round(sum(self.stages.values()), 6)
+        # The system keeps one peak per process, a road rendered after a larger one reports the larger peak
+        record['process_peak_rss'] = peak_rss()
+        return record
+
+
+class TimedWriter:
+    """File wrapper that counts the time spent in ``write`` as the ``write`` stage."""
+
+    def __init__(self, fp, metrics):
+        self.fp = fp
+        self.metrics = metrics
+
+    def write(self, data):
+        with self.metrics.stage('write'):
+            return self.fp.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+
+def peak_rss():
+    """Return the peak resident memory of this process since it started in
+    bytes, or None. It is not reset between the roads a process renders."""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def process_uptime():
+    """Return the seconds since this process was started, or None if unknown."""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.windll.kernel32
+        creation, exit_time, kernel_time, user_time, now = (wintypes.FILETIME() for _ in range(5))
+        if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(creation),
+                                        ctypes.byref(exit_time), ctypes.byref(kernel_time),
+                                        ctypes.byref(user_time)):
+            return None
+        kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+
+        def ticks(filetime):
+            return (filetime.dwHighDateTime << 32) | filetime.dwLowDateTime
+        # FILETIME counts 100 ns intervals
+        return (ticks(now) - ticks(creation)) / 1e7
+
+    try:
+        with open('/proc/self/stat', 'r') as fp:
+            # Fields after the command name start with the 3rd, starttime is the 22nd
+            start_ticks = int(fp.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as fp:
+            uptime = float(fp.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def write_record(filename, record):
+    """Append ``record`` to the JSON lines file ``filename``."""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'a', encoding='utf-8') as fp:
+        fp.write(json.dumps(record, sort_keys=True) + '\n')
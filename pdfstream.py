@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""PDF writer that appends the pages of other PDF files as they are read.
+
+Every object is written to the output as soon as it is copied, so only the
+file being appended and the offsets of the written objects are kept in
+memory. Images that appear in several files, like the header logo, are
+written once and shared by all pages.
+"""
+
+import hashlib
+
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+PAGES_ID = 1
+CATALOG_ID = 2
+
+
+def image_key(image):
+    # Raw stream data, so identical images compare equal without decoding
+    parts = [image.get('/Width'), image.get('/Height'), image.get('/ColorSpace'), image.get('/Filter')]
+    smask = image.get('/SMask')
+    for stream in (image, smask.getObject() if smask is not None else None):
+        if stream is not None:
+            parts.append(hashlib.sha1(stream._data).hexdigest())
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class StreamingPdfWriter:
+    """Write a PDF to the binary file ``fp`` one appended file at a time.
+
+    ``pages``, the object numbers of the pages, is the only list that grows
+    with the document.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.offsets = [None, None, None]
+        self.pages = []
+        self.images = {}
+        self.position = 0
+        self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def write(self, data):
+        # Also called by the objects that serialize themselves into the writer
+        self.fp.write(data)
+        self.position += len(data)
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _write_object(self, idnum, obj):
+        self.offsets[idnum] = self.position
+        self.write('{} 0 obj\n'.format(idnum).encode('ascii'))
+        obj.writeToStream(self, None)
+        self.write(b'\nendobj\n')
+
+    def append(self, filename):
+        """Append all pages of the PDF file ``filename``."""
+        reader = PdfFileReader(filename, strict=False)
+        ids = {}
+        queue = []
+
+        def copy(obj):
+            if isinstance(obj, IndirectObject):
+                if obj.idnum not in ids:
+                    target = obj.getObject()
+                    key = None
+                    if isinstance(target, StreamObject) and target.get('/Subtype') == '/Image':
+                        key = image_key(target)
+                    if key is not None and key in self.images:
+                        ids[obj.idnum] = self.images[key]
+                    else:
+                        ids[obj.idnum] = self._reserve()
+                        if key is not None:
+                            self.images[key] = ids[obj.idnum]
+                        queue.append((ids[obj.idnum], target))
+                return IndirectObject(ids[obj.idnum], 0, self)
+            if isinstance(obj, StreamObject):
+                result = StreamObject()
+                result._data = obj._data
+                for name, value in obj.items():
+                    if name != '/Length':
+                        result[name] = copy(value)
+                return result
+            if isinstance(obj, DictionaryObject):
+                result = DictionaryObject()
+                for name, value in obj.items():
+                    result[name] = copy(value)
+                return result
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(copy(value) for value in obj)
+            return obj
+
+        for page_idx in range(reader.getNumPages()):
+            page = reader.getPage(page_idx)
+            ref = page.indirectRef
+            if ref is not None and ref.idnum in ids:
+                idnum = ids[ref.idnum]
+            else:
+                idnum = self._reserve()
+                if ref is not None:
+                    ids[ref.idnum] = idnum
+            page_copy = DictionaryObject()
+            for name, value in page.items():
+                if name != '/Parent':
+                    page_copy[name] = copy(value)
+            page_copy[NameObject('/Parent')] = IndirectObject(PAGES_ID, 0, self)
+            self._write_object(idnum, page_copy)
+            self.pages.append(idnum)
+            while queue:
+                idnum, target = queue.pop()
+                self._write_object(idnum, copy(target))
+
+    def close(self):
+        """Write the page tree, the catalog and the cross-reference table."""
+        kids = ' '.join('{} 0 R'.format(idnum) for idnum in self.pages)
+        self.offsets[PAGES_ID] = self.position
+        self.write('{} 0 obj\n<< /Type /Pages /Kids [ {} ] /Count {} >>\nendobj\n'.format(
+            PAGES_ID, kids, len(self.pages)).encode('ascii'))
+        self.offsets[CATALOG_ID] = self.position
+        self.write('{} 0 obj\n<< /Type /Catalog /Pages {} 0 R >>\nendobj\n'.format(
+            CATALOG_ID, PAGES_ID).encode('ascii'))
+
+        xref = self.position
+        lines = ['xref', '0 {}'.format(len(self.offsets)), '0000000000 65535 f ']
+        lines.extend('{:010} 00000 n '.format(offset) for offset in self.offsets[1:])
+        lines.extend(['trailer', '<< /Size {} /Root {} 0 R >>'.format(len(self.offsets), CATALOG_ID),
+                      'startxref', str(xref), '%%EOF', ''])
+        self.write('\n'.join(lines).encode('ascii'))
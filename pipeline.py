@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Prepare the pictures of a road on a thread pool while its pages are laid out.
+
+:func:`renderer.prepare_pictures` resamples every picture before the first
+page is rendered. A :class:`PicturePipeline` takes its place when a road is
+rendered in one pass: a feeder thread submits the pictures in page order to
+a pool of worker threads, which read, decode and resample them, and hands
+them over through a bounded queue. The renderer asks for the picture of the
+next cell and only waits if it is not prepared yet, while the queue keeps
+the workers at most ``depth`` pages ahead of it.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import imagecache
+import renderer
+
+PIPELINE_WORKERS = 2
+# Pages the workers may prepare ahead of the page being rendered
+PIPELINE_DEPTH = 4
+# Seconds between checks whether the pipeline was closed while waiting
+POLL_INTERVAL = 0.1
+
+
+def get_key(path):
+    """Return the key of a picture, the same for every spelling of its path."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class PicturePipeline:
+    """Prepared pictures of a road, a replacement for the ``sources`` dict
+    of :func:`renderer.prepare_pictures`.
+
+    :meth:`get` must be called in the order of ``pictures``, as the pages
+    are rendered. :meth:`link_callback` resolves the original photos in an
+    HTML document to the prepared ones while xhtml2pdf reads them. Use it as
+    a context manager, or call :meth:`close`, to stop the workers.
+
+    The time the renderer waits for a picture is counted as the ``prepare``
+    stage of ``metrics``. The number of waits, the number of times the queue
+    was full, and the average and highest number of queued pictures are
+    recorded as ``pipeline_stalls``, ``pipeline_full``,
+    ``pipeline_occupancy`` and ``pipeline_peak``.
+    """
+
+    def __init__(self, pictures, options, log=print, cancel=None, workers=PIPELINE_WORKERS, depth=PIPELINE_DEPTH,
+                 metrics=None):
+        self.pictures = pictures
+        self.width = imagecache.pixels(renderer.get_cell_width(options), options['dpi'])
+        self.cache_dir = options.get('cache_dir') or imagecache.default_cache_dir
+        self.upright = renderer.needs_upright(options)
+        self.log = log
+        self.cancel = cancel
+        self.metrics = metrics
+        self.depth = max(1, depth)
+        self.paths = {get_key(photo.path) for photo in pictures}
+        self.sources = {}
+        self.cached = 0
+        self.stalls = 0
+        self.full = 0
+        self.peak = 0
+        self._occupancy = []
+        self._queue = queue.Queue(maxsize=self.depth * 6)
+        self._closed = threading.Event()
+        self._error = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pipeline')
+        self._feeder = threading.Thread(target=self._feed, name='pipeline-feeder', daemon=True)
+
+        self.sources[get_key(renderer.logo)] = renderer.prepare_logo(self.cache_dir, log)
+        self._feeder.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _feed(self):
+        try:
+            for photo in self.pictures:
+                if self._closed.is_set():
+                    return
+                future = self._executor.submit(self._prepare, photo)
+                item = (photo.path, future)
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    self.full += 1
+                    while not self._closed.is_set():
+                        try:
+                            self._queue.put(item, timeout=POLL_INTERVAL)
+                            break
+                        except queue.Full:
+                            continue
+        except Exception as e:
+            # Raised again by _take, which would otherwise wait for the pictures forever
+            self._error = e
+
+    def _prepare(self, photo):
+        if self._closed.is_set() or (self.cancel is not None and self.cancel.is_set()):
+            return photo.path, False, None
+        return renderer.prepare_photo(photo, self.width, self.cache_dir, self.upright)
+
+    def _take(self):
+        self._occupancy.append(self._queue.qsize())
+        self.peak = max(self.peak, self._occupancy[-1])
+        try:
+            path, future = self._queue.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            while True:
+                try:
+                    path, future = self._queue.get(timeout=POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    # The feeder puts its last picture before it stops
+                    if not self._feeder.is_alive() and self._queue.empty():
+                        raise RuntimeError('The pictures are no longer prepared') from self._error
+        else:
+            if not future.done():
+                self.stalls += 1
+        source, hit, error = future.result()
+        if error is not None:
+            self.log('# Could not resample {}: {}'.format(path, error))
+        self.cached += hit
+        self.sources[get_key(path)] = source
+
+    def get(self, path, default=None):
+        """Return the prepared file of ``path``, waiting until it is ready."""
+        key = get_key(path)
+        if key in self.sources:
+            return self.sources[key]
+        if key not in self.paths:
+            return default
+        if self.metrics is None:
+            while key not in self.sources:
+                self._take()
+        else:
+            with self.metrics.stage('prepare'):
+                while key not in self.sources:
+                    self._take()
+        return self.sources[key]
+
+    def link_callback(self, uri, rel):
+        """Resolve the photos and the logo of the document to the prepared
+        files, raises ``ValueError`` for other files instead of embedding them
+        as they are."""
+        if not uri.startswith('file:///'):
+            return uri
+        path = renderer.link_callback(uri, rel)
+        source = self.get(path)
+        if source is None:
+            raise ValueError('Picture is not prepared: ' + path)
+        return source
+
+    def close(self):
+        """Stop the workers and record the counters, pictures not handed over yet are dropped."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        # Unblock the feeder if it waits for room in the queue
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._feeder.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+        prepared = len(self.sources) - 1
+        self.log('# Pictures prepared: {} of {} px wide, {} from cache, waited {} times'.format(
+            prepared, self.width, self.cached, self.stalls))
+        if self.metrics is not None:
+            self.metrics.set('pipeline_stalls', self.stalls)
+            self.metrics.set('pipeline_full', self.full)
+            occupancy = sum(self._occupancy) / len(self._occupancy) if self._occupancy else 0.0
+            self.metrics.set('pipeline_occupancy', round(occupancy, 2))
+            self.metrics.set('pipeline_peak', self.peak)
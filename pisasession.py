@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Render documents with xhtml2pdf without parsing the stylesheet again.
+
+``pisa.CreatePDF`` parses the default stylesheet of xhtml2pdf and the
+``<style>`` of the document into a new context for every document. Only the
+``@page`` rule of :mod:`renderer` depends on the options, so a
+:class:`Session` parses both stylesheets once per page setting and every
+document only parses its ``@page`` rule. That rule builds the page templates
+and frames, which keep the state of the document being built and cannot be
+shared.
+"""
+
+import io
+import weakref
+
+from reportlab.platypus.frames import Frame
+from xhtml2pdf.context import pisaContext, pisaCSSBuilder, pisaCSSParser
+from xhtml2pdf.default import DEFAULT_CSS
+from xhtml2pdf.document import pisaStory
+from xhtml2pdf.util import getBox
+from xhtml2pdf.w3c import css
+from xhtml2pdf.xhtml2pdf_reportlab import PmlBaseDoc, PmlPageTemplate
+
+from metrics import Metrics
+
+# Sessions of this process, keyed by their stylesheets
+_sessions = {}
+
+
+class Session:
+    """The parsed stylesheets of the documents with the same ``page_style``."""
+
+    def __init__(self, page_style, document_style):
+        self.page_style = page_style
+        context = pisaContext(None)
+        context.addDefaultCSS(DEFAULT_CSS)
+        context.addCSS(document_style)
+        context.parseCSS()
+        self.css = context.css
+        self.css_default = context.cssDefault
+
+
+def get_session(page_style, document_style):
+    key = (page_style, document_style)
+    if key not in _sessions:
+        _sessions[key] = Session(page_style, document_style)
+    return _sessions[key]
+
+
+class SessionContext(pisaContext):
+    """Context that takes the stylesheets from ``session`` instead of the document."""
+
+    def __init__(self, session, metrics):
+        super(SessionContext, self).__init__(None)
+        self.session = session
+        self.metrics = metrics
+
+    def parseCSS(self):
+        with self.metrics.stage('setup'):
+            # Same as pisaContext.parseCSS, which binds the parser to its context
+            self.cssBuilder = pisaCSSBuilder(mediumSet=['all', 'print', 'pdf'])
+            self.cssBuilder._c = weakref.ref(self)
+            pisaCSSBuilder.c = property(lambda self: self._c())
+            self.cssParser = pisaCSSParser(self.cssBuilder)
+            self.cssParser.rootPath = self.pathDirectory
+            self.cssParser._c = weakref.ref(self)
+            pisaCSSParser.c = property(lambda self: self._c())
+
+            # Sets the page size and builds the page templates of this document
+            self.cssParser.parse(self.session.page_style)
+            self.css = self.session.css
+            self.cssDefault = self.session.css_default
+            self.cssCascade = css.CSSCascadeStrategy(userAgent=self.cssDefault, user=self.css)
+            self.cssCascade.parser = self.cssParser
+
+
+def create_pdf(content, dest, page_style, document_style, link_callback=None, metrics=None):
+    """Render ``content``, whose ``<style>`` is ``page_style`` followed by
+    ``document_style``, to the binary file ``dest`` like ``pisa.CreatePDF``.
+
+    Returns the number of errors. Getting the session and preparing the
+    context of the document is counted as the ``setup`` stage of ``metrics``.
+    """
+    metrics = metrics or Metrics()
+    with metrics.stage('setup'):
+        context = SessionContext(get_session(page_style, document_style), metrics)
+        context.pathCallback = link_callback
+    context = pisaStory(content, link_callback=link_callback, context=context)
+
+    out = io.BytesIO()
+    doc = PmlBaseDoc(
+        out,
+        pagesize=context.pageSize,
+        author=context.meta['author'].strip(),
+        subject=context.meta['subject'].strip(),
+        keywords=[x.strip() for x in context.meta['keywords'].strip().split(',') if x],
+        title=context.meta['title'].strip(),
+        showBoundary=0,
+        allowSplitting=1)
+
+    if 'body' in context.templateList:
+        body = context.templateList.pop('body')
+    else:
+        x, y, w, h = getBox('1cm 1cm -1cm -1cm', context.pageSize)
+        body = PmlPageTemplate(
+            id='body',
+            frames=[Frame(x, y, w, h, id='body', leftPadding=0, rightPadding=0, bottomPadding=0, topPadding=0)],
+            pagesize=context.pageSize)
+    doc.addPageTemplates([body] + list(context.templateList.values()))
+    doc.build(context.story)
+
+    dest.write(out.getvalue())
+    return context.err
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Preview of the scanned photos of every road, with lazily loaded thumbnails.
+
+Thumbnails are only requested for the rows the view paints. They are decoded
+in a ``QThreadPool``, from the thumbnail embedded in the EXIF data of a JPEG
+when there is one, and kept in a cache bounded by its size in bytes.
+"""
+
+import os
+import struct
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap, QTransform
+
+THUMBNAIL_SIZE = QSize(96, 72)
+CACHE_BYTES = 32 * 1024 * 1024
+COLUMNS = ('Photo', 'STA', 'Side', 'Folder')
+
+# EXIF tags
+TAG_ORIENTATION = 0x0112
+TAG_THUMBNAIL_OFFSET = 0x0201
+TAG_THUMBNAIL_LENGTH = 0x0202
+
+
+def _read_ifd(tiff, offset, endian):
+    """Return the tags of the IFD at ``offset`` as ``{tag: value}`` and the offset of the next IFD."""
+    count, = struct.unpack_from(endian + 'H', tiff, offset)
+    tags = {}
+    for entry_idx in range(count):
+        tag, kind, _ = struct.unpack_from(endian + 'HHI', tiff, offset + 2 + entry_idx * 12)
+        # SHORT values are left aligned in the 4 byte value field
+        value_format = 'H' if kind == 3 else 'I'
+        tags[tag], = struct.unpack_from(endian + value_format, tiff, offset + 10 + entry_idx * 12)
+    next_offset, = struct.unpack_from(endian + 'I', tiff, offset + 2 + count * 12)
+    return tags, next_offset
+
+
+def exif_thumbnail(filename):
+    """Return ``(thumbnail, orientation)`` of a JPEG, the thumbnail being the
+    embedded JPEG data or None. Only the start of the file is read.
+    """
+    with open(filename, 'rb') as fp:
+        head = fp.read(128 * 1024)
+    if head[:2] != b'\xff\xd8':
+        return None, 1
+    offset = 2
+    try:
+        while offset + 4 <= len(head) and head[offset] == 0xff:
+            marker = head[offset + 1]
+            length, = struct.unpack_from('>H', head, offset + 2)
+            if marker == 0xda:
+                break
+            if marker == 0xe1 and head[offset + 4:offset + 10] == b'Exif\0\0':
+                tiff = head[offset + 10:offset + 2 + length]
+                endian = '<' if tiff[:2] == b'II' else '>'
+                ifd0, = struct.unpack_from(endian + 'I', tiff, 4)
+                tags, ifd1 = _read_ifd(tiff, ifd0, endian)
+                orientation = tags.get(TAG_ORIENTATION, 1)
+                if not ifd1:
+                    return None, orientation
+                tags, _ = _read_ifd(tiff, ifd1, endian)
+                start = tags.get(TAG_THUMBNAIL_OFFSET)
+                size = tags.get(TAG_THUMBNAIL_LENGTH)
+                if not (start and size) or tiff[start:start + 2] != b'\xff\xd8':
+                    return None, orientation
+                return bytes(tiff[start:start + size]), orientation
+            offset += 2 + length
+    except struct.error:
+        pass
+    return None, 1
+
+
+def orient(image, orientation):
+    """Apply the EXIF ``orientation`` to ``image``."""
+    if orientation in (2, 4):
+        return image.mirrored(orientation == 2, orientation == 4)
+    angle = {3: 180, 5: 90, 6: 90, 7: 270, 8: 270}.get(orientation)
+    if angle is None:
+        return image
+    image = image.transformed(QTransform().rotate(angle))
+    return image.mirrored(True, False) if orientation in (5, 7) else image
+
+
+def load_thumbnail(filename, size=THUMBNAIL_SIZE):
+    """Decode a thumbnail of a photo, returns a null ``QImage`` on errors.
+
+    Falls back to a scaled decode of the photo when it has no EXIF thumbnail.
+    """
+    try:
+        data, orientation = exif_thumbnail(filename)
+    except OSError:
+        return QImage()
+    image = QImage.fromData(data) if data else QImage()
+    if not image.isNull():
+        image = orient(image, orientation)
+    else:
+        reader = QImageReader(filename)
+        reader.setAutoTransform(True)
+        if reader.size().isValid():
+            reader.setScaledSize(reader.size().scaled(size * 2, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return image
+    return image.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+class ThumbnailCache:
+    """Least recently used thumbnails, bounded by their size in bytes."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.discard(key)
+        self._items[key] = pixmap
+        self.total_bytes += self.cost(pixmap)
+        while self.total_bytes > self.max_bytes and len(self._items) > 1:
+            _, oldest = self._items.popitem(last=False)
+            self.total_bytes -= self.cost(oldest)
+
+    def discard(self, key):
+        pixmap = self._items.pop(key, None)
+        if pixmap is not None:
+            self.total_bytes -= self.cost(pixmap)
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def cost(pixmap):
+        # Null pixmaps of broken photos count with their bookkeeping only
+        return 256 + pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+
+
+class ThumbnailLoader(QRunnable):
+    def __init__(self, filename, signals):
+        super(ThumbnailLoader, self).__init__()
+        self.filename = filename
+        self.signals = signals
+
+    def run(self):
+        self.signals.loaded.emit(self.filename, load_thumbnail(self.filename))
+
+
+class PreviewModel(QAbstractItemModel):
+    """Tree of roads and their photos in render order.
+
+    Road rows have the internal id 0, photo rows the row of their road plus one.
+    """
+
+    def __init__(self, parent=None, cache_bytes=CACHE_BYTES):
+        super(PreviewModel, self).__init__(parent)
+        self.roads = []
+        self.rows = {}
+        self.cache = ThumbnailCache(cache_bytes)
+        self.requested = set()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(4, QThreadPool.globalInstance().maxThreadCount())))
+        self.signals = ThumbnailSignals(self)
+        self.signals.loaded.connect(self.thumbnail_loaded)
+
+    def set_roads(self, roads):
+        """Show ``roads``, a list of ``(road folder, photo records)``."""
+        self.cancel_pending()
+        self.beginResetModel()
+        self.roads = roads
+        self.rows = {}
+        for road_row, (_, photos) in enumerate(roads):
+            for photo_row, photo in enumerate(photos):
+                self.rows[photo.path] = (road_row, photo_row)
+        self.cache.clear()
+        self.endResetModel()
+
+    def cancel_pending(self):
+        """Forget the thumbnails not being decoded yet, e.g. rows scrolled out of view."""
+        self.pool.clear()
+        self.requested.clear()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.roads)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.roads[parent.row()][1])
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            road, photos = self.roads[index.row()]
+            if role == Qt.DisplayRole and index.column() == 0:
+                return '{} ({} photos)'.format(os.path.basename(road), len(photos))
+            if role == Qt.ToolTipRole:
+                return road
+            return None
+
+        road, photos = self.roads[index.internalId() - 1]
+        photo = photos[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return '{}. {}'.format(index.row() + 1, os.path.basename(photo.path))
+            if column == 1:
+                return photo.sta
+            if column == 2:
+                return photo.side
+            if column == 3:
+                folder = os.path.relpath(os.path.dirname(photo.path), road)
+                return '' if folder == os.curdir else folder
+        elif role == Qt.DecorationRole and column == 0:
+            return self.thumbnail(photo.path)
+        elif role == Qt.ToolTipRole:
+            return photo.path
+        return None
+
+    def thumbnail(self, filename):
+        pixmap = self.cache.get(filename)
+        if pixmap is None and filename not in self.requested:
+            self.requested.add(filename)
+            self.pool.start(ThumbnailLoader(filename, self.signals))
+        return pixmap
+
+    def thumbnail_loaded(self, filename, image):
+        self.requested.discard(filename)
+        row = self.rows.get(filename)
+        if row is None:
+            return
+        # A null pixmap is cached too, so broken photos are not decoded again
+        self.cache.put(filename, QPixmap.fromImage(image))
+        road_row, photo_row = row
+        index = self.index(photo_row, 0, self.index(road_row, 0))
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
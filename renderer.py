@@ -0,0 +1,938 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from string import Template
+
+from reportlab import rl_config
+from reportlab.lib import pagesizes
+from reportlab.lib.units import cm
+
+import imagecache
+import manifest
+import scanner
+from metrics import Metrics, TimedWriter
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+logo = os.path.join(BASE_DIR, 'logo.png')
+# Printed width of the logo in header_template, in cm, and its resolution
+LOGO_WIDTH = 1.6
+LOGO_DPI = 300
+
+# Width of the spacer columns between photos in table_template, in cm
+CELL_SPACING = 1
+
+# Folder next to the PDFs keeping the finished chunks of an interrupted road
+CHUNKS_DIRNAME = '.documentation-chunks'
+
+ENGINE_HTML = 'html'
+ENGINE_CANVAS = 'canvas'
+
+# Paper sizes of reportlab.lib.pagesizes offered in the GUI, in display order
+PAPER_SIZES = (
+    'A0', 'A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8', 'A9', 'A10',
+    'B0', 'B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B9', 'B10',
+    'C0', 'C1', 'C2', 'C3', 'C4', 'C5', 'C6', 'C7', 'C8', 'C9', 'C10',
+    'ELEVENSEVENTEEN', 'GOV_LEGAL', 'GOV_LETTER', 'HALF_LETTER', 'JUNIOR_LEGAL',
+    'LEDGER', 'LEGAL', 'LETTER', 'TABLOID',
+)
+
+# Write the streams of the PDF, above all the JPEG data that is embedded as
+# it is, in binary instead of ASCII85, which is a quarter larger
+rl_config.useA85 = 0
+
+# Options used when no settings are given
+DEFAULT_OPTIONS = {
+    'title': '',
+    'no_distribusi': '12345',
+    'no_leger': '15 000 -- K 000 1',
+    'supervisor': '',
+    'paper_size': 'A3',
+    'paper_orientation': 'Landscape',
+    'paper_width': '',
+    'paper_height': '',
+    'margin_top': '1',
+    'margin_bottom': '1',
+    'margin_left': '1',
+    'margin_right': '1',
+    'dpi': 150,
+    'engine': ENGINE_HTML,
+    'chunk_pages': 0,
+    'chunk_workers': 0,
+    'profile_dir': '',
+    'memory_limit': 0,
+    'catalog': '',
+    'pipeline_workers': 2,
+    'pipeline_depth': 4,
+}
+
+# Estimated memory of rendering a road in parts: the interpreter with the PDF
+# libraries, in MB, plus for every page of the part a fixed overhead, in MB,
+# and a multiple of the size of the embedded photo files
+STREAM_BASE_MEMORY = 120
+STREAM_PAGE_MEMORY = 1
+STREAM_IMAGE_FACTOR = {ENGINE_HTML: 5, ENGINE_CANVAS: 4}
+
+
+class Cancelled(Exception):
+    pass
+
+
+# The templates below are written in the exact form the BeautifulSoup/lxml
+# builder used to serialize them, including the <html><body> wrapper of every
+# page fragment, so that generated documents stay byte for byte the same.
+# The @page rule is the only part of the stylesheet that depends on the
+# options, the rest is parsed once per process, see :mod:`pisasession`.
+page_style_template = Template('''@page {
+        size: ${page_size};
+
+        @frame content_frame {
+          top: ${margin_top};
+          left: ${margin_left};
+          right: ${margin_right};
+        }
+
+        @frame footer_frame {
+          -pdf-frame-content: footer_content;
+          top: 26.5cm;
+          left: ${margin_left};
+          right: ${margin_right};
+        }
+      }''')
+
+document_style = '''body {
+        font-family: Helvetica sans-serif;
+      }
+
+      h1 {
+        font-size: 18pt;
+        margin: 0;
+      }
+
+      h2 {
+        font-size: 14pt;
+        margin: 0;
+      }
+
+      h3 {
+        font-size: 11pt;
+        font-weight: 500;
+        margin: 0;
+      }
+
+      table {
+        width: 100%;
+        border-collapse: collapse;
+      }
+
+      td.box {
+        width: 18pt;
+        height: 16pt;
+        border: 1pt solid black;
+        text-align: center;
+        padding-top: 2pt;
+      }
+
+      td.separator {
+        width: 6pt;
+      }
+
+      .valign-top {
+        vertical-align: top;
+      }
+
+      .valign-bottom {
+        vertical-align: bottom;
+      }
+
+      .table-box td {
+        font-weight: bold;
+        font-size: 10pt;
+        height: 16pt;
+      }
+
+      .header {
+        margin-bottom: 0.5cm;
+      }
+
+      .table-content {
+        page-break-after: always;
+      }
+
+      .table-content img {
+        width: 100%;
+      }
+
+      .img-container {
+        text-align: center;
+      }'''
+
+document_template = Template('''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<title>Document</title>
+<style>
+      ${page_style}
+
+      ${document_style}
+    </style>
+</head>
+<body>
+<div id="footer_content" style="text-align: center; font-size: 10pt; font-weight: bold">${footer}</div>
+''')
+
+document_end = '''</body>
+</html>
+'''
+
+footer_template = Template('''
+<p style="margin-bottom: 30pt">PENANGGUNG JAWAB LAPANGAN</p>
+<p id="supervisor" style="text-decoration: underline; margin-bottom: 0">${supervisor}</p>
+<p style="margin-top: 0">Team Leader</p>
+''')
+
+header_template = Template('''<html><body><div class="header">
+<table>
+<tr>
+<td class="valign-top" width="30%">
+<table>
+<tr>
+<td class="valign-top" width="1.6cm">
+<img class="logo" src=${logo} width="1.6cm"/>
+</td>
+<td>
+<h2>PEMERINTAH KOTA JAMBI</h2>
+<h3>DINAS PEKERJAAN UMUM DAN PENATAAN RUANG</h3>
+<p style="font-size: 8pt; margin: 0">
+                ALAMAT: JL. H. ZAINIR HAVIZ NO. 04, KEC. KOTABARU JAMBI TELP. 40553
+                </p>
+</td>
+</tr>
+</table>
+</td>
+<td align="center">
+<h1 class="title">${title}</h1>
+</td>
+<td width="30%">
+<table class="table-box">
+<tr>
+<td>
+<table>
+<tr class="no-distribusi">
+<td>NOMOR DISTRIBUSI KE</td>
+${no_distribusi}</tr>
+</table>
+</td>
+</tr>
+<tr>
+<td style="vertical-align: bottom">NOMOR LEMBAR KARTU LEGER JALAN:</td>
+</tr>
+<tr>
+<td>
+<table>
+<tr class="no-leger">
+<td></td>
+${no_leger}</tr>
+</table>
+</td>
+</tr>
+</table>
+</td>
+</tr>
+</table>
+</div>
+</body></html>''')
+
+# The header up to and after the boxes of the leger number
+header_head_template, header_tail = header_template.template.split('${no_leger}')
+header_head_template = Template(header_head_template)
+
+header_box = '<td class="box">{}</td>'
+header_separator = '<td class="separator"></td>'
+
+table_template = Template('''<html><body><table class="table-content">
+<tr>
+<td class="cell-0">${cell_0}</td>
+<td width="1cm"></td>
+<td class="cell-1">${cell_1}</td>
+<td width="1cm"></td>
+<td class="cell-2">${cell_2}</td>
+</tr>
+<tr>
+<td height="1cm"></td>
+</tr>
+<tr>
+<td class="cell-3">${cell_3}</td>
+<td width="1cm"></td>
+<td class="cell-4">${cell_4}</td>
+<td width="1cm"></td>
+<td class="cell-5">${cell_5}</td>
+</tr>
+</table>
+</body></html>''')
+
+picture_template = Template('''<html><body><table>
+<tr>
+<td class="img-container" colspan="5">
+<img src=${src}/>
+</td>
+</tr>
+<tr>
+<td height="24pt"></td>
+</tr>
+<tr>
+<td></td>
+<td>NOMOR RUAS</td>
+<td width="10pt">:</td>
+<td class="no-ruas">${no_ruas}</td>
+<td></td>
+</tr>
+<tr>
+<td></td>
+<td>NAMA RUAS</td>
+<td width="10pt">:</td>
+<td class="nama-ruas">${nm_ruas}</td>
+<td></td>
+</tr>
+<tr>
+<td></td>
+<td>STA</td>
+<td width="10pt">:</td>
+<td class="sta">${sta}</td>
+<td></td>
+</tr>
+</table>
+</body></html>''')
+
+
+def get_page_size(options):
+    paper_size = options['paper_size'].lower()
+    if paper_size == 'custom':
+        return '{}cm {}cm'.format(options['paper_width'], options['paper_width'])
+    return '{} {}'.format(paper_size, options['paper_orientation'].lower())
+
+
+def to_cm(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def get_page_dimensions(options):
+    """Return the page width and height in cm."""
+    if options['paper_size'].lower() == 'custom':
+        return to_cm(options['paper_width']), to_cm(options['paper_height'])
+    size = getattr(pagesizes, options['paper_size'])
+    if options['paper_orientation'].lower() == 'landscape':
+        size = pagesizes.landscape(size)
+    else:
+        size = pagesizes.portrait(size)
+    return size[0] / cm, size[1] / cm
+
+
+def get_cell_width(options):
+    """Return the printed width of a photo cell in cm."""
+    page_width, _ = get_page_dimensions(options)
+    content_width = page_width - to_cm(options['margin_left']) - to_cm(options['margin_right'])
+    return (content_width - 2 * CELL_SPACING) / 3
+
+
+def prepare_pictures(pictures, options, log=print, cancel=None):
+    """Resample pictures to the resolution of their cell.
+
+    Returns a dict mapping the path of every picture to the file that should
+    be embedded. The header logo is prepared once at ``LOGO_DPI`` and mapped
+    the same way, so every page of a PDF refers to the same small image.
+    Resampling is disabled when ``options['dpi']`` is 0.
+    """
+    dpi = options.get('dpi', 0)
+    if not dpi:
+        return {}
+
+    width = imagecache.pixels(get_cell_width(options), dpi)
+    cache_dir = options.get('cache_dir') or imagecache.default_cache_dir
+    upright = needs_upright(options)
+    sources = {}
+    cached = 0
+    for photo in pictures:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        sources[photo.path], hit, error = prepare_photo(photo, width, cache_dir, upright)
+        if error is not None:
+            log('# Could not resample {}: {}'.format(photo.path, error))
+        cached += hit
+    log('# Pictures prepared: {} px wide at {} dpi, {} from cache'.format(width, dpi, cached))
+    sources[logo] = prepare_logo(cache_dir, log)
+    return sources
+
+
+def needs_upright(options):
+    """Return True if the photos must be turned upright before rendering.
+    The native engine applies the EXIF orientation when drawing them."""
+    return options.get('engine') != ENGINE_CANVAS
+
+
+def prepare_photo(photo, width, cache_dir, upright=True):
+    """Return ``(source, from cache, error)`` of one picture, the source is
+    the photo itself if it cannot be resampled."""
+    try:
+        source, hit = imagecache.prepare_picture(photo.path, width, cache_dir, photo.digest, upright)
+    except (OSError, ValueError) as e:
+        return photo.path, False, e
+    return source, hit, None
+
+
+def prepare_logo(cache_dir, log=print):
+    try:
+        source, _ = imagecache.prepare_picture(logo, imagecache.pixels(LOGO_WIDTH, LOGO_DPI), cache_dir)
+    except (OSError, ValueError) as e:
+        log('# Could not resample {}: {}'.format(logo, e))
+        return logo
+    return source
+
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def quote(value):
+    """Escape and quote an attribute value."""
+    value = escape(value)
+    if '"' in value:
+        if "'" in value:
+            return '"{}"'.format(value.replace('"', '&quot;'))
+        return "'{}'".format(value)
+    return '"{}"'.format(value)
+
+
+def file_url(path):
+    return 'file:///' + os.path.abspath(path).replace('\\', '/')
+
+
+# Leger numbers like "15 000 -- K 000 1", the road number replaces the first
+# three digits and the page number the second ones
+leger_pattern = re.compile(r'^(\d{2} )(\d{3})( .{2} \w )(\d{3})( \d)$')
+
+
+def get_boxes(text):
+    boxes = []
+    for n in text:
+        if n == ' ':
+            boxes.append(header_separator)
+        else:
+            boxes.append(header_box.format(escape(n)))
+    return ''.join(boxes)
+
+
+def get_header_numbers(options, no_ruas, page_number):
+    """Return the distribution and leger numbers printed on a page."""
+    no_distribusi = options['no_distribusi'].strip()
+    no_leger = options['no_leger']
+
+    def replace_no_leger(match):
+        return match.group(1) + str(no_ruas) + match.group(3) + get_page_digits(page_number) + match.group(5)
+    no_leger = leger_pattern.sub(replace_no_leger, no_leger)
+    return no_distribusi, no_leger
+
+
+def get_page_digits(page_number):
+    return '{:0>3}'.format(page_number)
+
+
+@lru_cache(maxsize=64)
+def get_header_parts(title, no_distribusi, no_leger, no_ruas, logo_src):
+    """Return the header of the pages of a road as the fragments before and
+    after the boxes of the page number, or the whole header and None when the
+    leger number does not contain the page number."""
+    head = header_head_template.substitute(
+        logo=quote(file_url(logo_src)),
+        title=escape(title),
+        no_distribusi=get_boxes(no_distribusi.strip()))
+    match = leger_pattern.match(no_leger)
+    if match is None:
+        return head + get_boxes(no_leger) + header_tail, None
+    before_page = match.group(1) + str(no_ruas) + match.group(3)
+    after_page = match.group(5) + no_leger[match.end():]
+    return head + get_boxes(before_page), get_boxes(after_page) + header_tail
+
+
+def get_header(options, no_ruas, page_number, logo_src=logo):
+    """Return the header of a page, patching the page number into the
+    fragments of :func:`get_header_parts`."""
+    before, after = get_header_parts(options['title'], options['no_distribusi'], options['no_leger'], no_ruas,
+                                     logo_src)
+    if after is None:
+        return before
+    return before + get_boxes(get_page_digits(page_number)) + after
+
+
+def get_page_style(options):
+    return page_style_template.substitute(
+        page_size=get_page_size(options),
+        margin_top=options['margin_top'] + 'cm',
+        margin_left=options['margin_left'] + 'cm',
+        margin_right=options['margin_right'] + 'cm')
+
+
+def get_sta(photo):
+    return ' '.join([photo.sta, photo.side])
+
+
+def get_picture(photo, src, no_ruas, nm_ruas):
+    return picture_template.substitute(
+        src=quote(file_url(src)),
+        no_ruas=escape(no_ruas),
+        nm_ruas=escape(nm_ruas),
+        sta=escape(get_sta(photo)))
+
+
+def build_document(no_ruas, nm_ruas, pictures, options, sources=None, progress=None, cancel=None,
+                   first_page=1, metrics=None):
+    """Return the HTML document of a road, six pictures per page.
+
+    ``pictures`` are :class:`scanner.Photo` records. ``sources`` maps their
+    paths to the files that are embedded instead of them. ``first_page`` is
+    the page number printed on the first page.
+    ``progress(value, maximum)`` is called after every page, with one step
+    left over for rendering the PDF. The time spent on the headers and on the
+    rest of the document is added to the ``header`` and ``html`` stages of
+    ``metrics``.
+    """
+    metrics = metrics or Metrics()
+    with metrics.stage('html'):
+        return _build_document(no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page,
+                               metrics)
+
+
+def _build_document(no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page, metrics):
+    sources = sources or {}
+    page_count = (len(pictures) + 5) // 6
+    if progress is not None:
+        progress(0, page_count + 1)
+
+    logo_src = sources.get(logo, logo)
+    footer = footer_template.substitute(supervisor=escape('( {} )'.format(options['supervisor'])))
+    # TODO: Remove this line to show footer
+    footer = ''
+
+    parts = [document_template.substitute(
+        page_style=get_page_style(options),
+        document_style=document_style,
+        footer=footer)]
+
+    for page_idx in range(page_count):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        page_pictures = pictures[page_idx * 6:(page_idx + 1) * 6]
+        cells = {'cell_{}'.format(cell_idx): '' for cell_idx in range(6)}
+        for cell_idx, photo in enumerate(page_pictures):
+            cells['cell_{}'.format(cell_idx)] = get_picture(
+                photo, sources.get(photo.path, photo.path), no_ruas, nm_ruas)
+        with metrics.stage('header'):
+            parts.append(get_header(options, no_ruas, first_page + page_idx, logo_src))
+        parts.append(table_template.substitute(cells))
+        if progress is not None:
+            progress(page_idx + 1, page_count + 1)
+
+    parts.append(document_end)
+    return ''.join(parts)
+
+
+def get_stream_pages(pictures, options, sources=None):
+    """Return the pages per part that keep a road within ``options['memory_limit']``
+    MB, or 0 when the limit is disabled.
+
+    The memory of a page is estimated from the average size of the files
+    embedded for ``pictures``, see ``STREAM_BASE_MEMORY``.
+    """
+    memory_limit = options.get('memory_limit') or 0
+    if memory_limit <= 0 or not pictures:
+        return 0
+    sources = sources or {}
+    image_bytes = 0
+    for photo in pictures:
+        try:
+            image_bytes += os.path.getsize(sources.get(photo.path, photo.path))
+        except OSError:
+            image_bytes += photo.size
+    factor = STREAM_IMAGE_FACTOR.get(options.get('engine'), STREAM_IMAGE_FACTOR[ENGINE_HTML])
+    page_memory = STREAM_PAGE_MEMORY + 6 * factor * image_bytes / len(pictures) / 2 ** 20
+    return max(1, int((memory_limit - STREAM_BASE_MEMORY) / page_memory))
+
+
+def parse_road(src_dir):
+    """Return ``(no_ruas, nm_ruas)`` of a road folder, or None if it is not one."""
+    parts = re.split(r' ?- ?', os.path.basename(src_dir))
+    if len(parts) != 2:
+        return None
+    return tuple(parts)
+
+
+def find_pictures(src_dir, catalog_file=None):
+    """Return the :class:`scanner.Photo` records of a road folder, updating
+    and querying the photo catalog ``catalog_file`` if one is given."""
+    if catalog_file:
+        import catalog
+
+        return catalog.scan_road(catalog_file, src_dir)
+    return scanner.scan_road(src_dir)
+
+
+def get_output_path(src_dir, output_dir):
+    output = os.path.join(output_dir, '{}.pdf'.format(os.path.basename(src_dir)))
+    return output.replace('\\', '/')
+
+
+def insert_picture(src_dir, output_dir, options, log=print, progress=None, cancel=None, pictures=None,
+                   metrics=None):
+    """Build and write the PDF of a road folder.
+
+    ``progress(value, maximum)`` is called after every page and once more when
+    the PDF is written. If ``cancel`` is set, :class:`Cancelled` is raised
+    before the next page is started. ``pictures`` skips the folder scan when
+    the caller already has the picture list.
+
+    With ``options['chunk_pages']``, roads with more pages are split into
+    chunks of that many pages, rendered concurrently and merged. Otherwise,
+    with ``options['memory_limit']``, roads that would not fit are rendered
+    one part after the other and streamed into the PDF. Roads rendered in
+    one pass get their pictures prepared by a :class:`pipeline.PicturePipeline`
+    of ``options['pipeline_workers']`` threads while the pages are
+    rendered, at most ``options['pipeline_depth']`` pages ahead. The time of
+    every stage and the photo, page and byte counts are recorded in
+    ``metrics``. With ``options['profile_dir']``, a cProfile dump of the
+    render stage is written there as ``<road>.prof``.
+    """
+    metrics = metrics or Metrics()
+    basename = os.path.basename(src_dir)
+    road = parse_road(src_dir)
+    if road is None:
+        log('Invalid directory ' + basename)
+        return
+    no_ruas, nm_ruas = road
+
+    if pictures is None:
+        with metrics.stage('scan'):
+            pictures = find_pictures(src_dir, options.get('catalog'))
+
+    log('# Pictures found: ' + str(len(pictures)))
+    output = get_output_path(src_dir, output_dir)
+    page_count = (len(pictures) + 5) // 6
+    metrics.set('photos', len(pictures))
+    metrics.set('pages', page_count)
+    chunk_pages = options.get('chunk_pages') or 0
+    pipeline_workers = options.get('pipeline_workers', DEFAULT_OPTIONS['pipeline_workers']) or 0
+    # Chunks and parts need every picture prepared up front to be split
+    if (pipeline_workers > 0 and options.get('dpi') and not 0 < chunk_pages < page_count
+            and not options.get('memory_limit')):
+        from pipeline import PicturePipeline
+
+        sources = PicturePipeline(pictures, options, log, cancel, pipeline_workers,
+                                  options.get('pipeline_depth') or DEFAULT_OPTIONS['pipeline_depth'], metrics)
+    else:
+        with metrics.stage('prepare'):
+            sources = prepare_pictures(pictures, options, log, cancel)
+
+    profiler = None
+    if options.get('profile_dir'):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        stream_pages = get_stream_pages(pictures, options, sources)
+        if 0 < chunk_pages < page_count:
+            status = render_chunks(output, no_ruas, nm_ruas, pictures, options, sources, log, progress, cancel,
+                                   metrics)
+        elif 0 < stream_pages < page_count:
+            status = render_stream(output, no_ruas, nm_ruas, pictures, options, sources, stream_pages, log,
+                                   progress, cancel, metrics)
+        else:
+            status = render_pages(output, no_ruas, nm_ruas, pictures, options, sources, log, progress, cancel,
+                                  metrics=metrics)
+    finally:
+        if hasattr(sources, 'close'):
+            sources.close()
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(options['profile_dir'], exist_ok=True)
+            profile = os.path.join(options['profile_dir'], basename + '.prof')
+            profiler.dump_stats(profile)
+            log('# Profile written: ' + profile)
+    metrics.set('output_size', os.path.getsize(output))
+    if progress is not None:
+        progress(page_count + 1, page_count + 1)
+    return status
+
+
+def render_pages(output, no_ruas, nm_ruas, pictures, options, sources, log=print, progress=None, cancel=None,
+                 first_page=1, metrics=None):
+    """Write the pages of ``pictures`` to ``output`` with the selected engine."""
+    if options.get('engine') == ENGINE_CANVAS:
+        import canvas_renderer
+
+        log('# Drawing PDF: ' + output)
+        status = canvas_renderer.render_pdf(output, no_ruas, nm_ruas, pictures, options, sources, progress, cancel,
+                                            first_page, metrics)
+        log('Done!')
+        return status
+
+    # A pipeline prepares the photos while xhtml2pdf reads them, the document refers to the originals
+    callback = getattr(sources, 'link_callback', link_callback)
+    if callback is not link_callback:
+        sources = {}
+    content = build_document(no_ruas, nm_ruas, pictures, options, sources, progress, cancel, first_page, metrics)
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    return convert_to_pdf(content, output=output, log=log, metrics=metrics, page_style=get_page_style(options),
+                          link_callback=callback)
+
+
+def _init_chunk_worker():
+    # Cancelling is left to the process that merges the chunks
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _render_chunk(output, no_ruas, nm_ruas, pictures, options, sources, first_page):
+    return render_pages(output, no_ruas, nm_ruas, pictures, options, sources, lambda message: None,
+                        first_page=first_page)
+
+
+def get_chunk_dir(output, pictures, options):
+    """Return the folder keeping the finished chunks of ``output`` between runs.
+
+    The folder is emptied when the photos or settings changed since its
+    chunks were rendered.
+    """
+    settings = {key: value for key, value in options.items() if key not in manifest.IGNORED_OPTIONS}
+    inputs = [[[photo.path, photo.size, photo.mtime_ns] for photo in pictures], settings, options['chunk_pages']]
+    key = hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+    chunk_dir = os.path.join(os.path.dirname(output), CHUNKS_DIRNAME,
+                             os.path.splitext(os.path.basename(output))[0])
+    key_filename = os.path.join(chunk_dir, 'key')
+    try:
+        with open(key_filename, 'r', encoding='ascii') as fp:
+            if fp.read() == key:
+                return chunk_dir
+    except OSError:
+        pass
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    os.makedirs(chunk_dir)
+    with open(key_filename, 'w', encoding='ascii') as fp:
+        fp.write(key)
+    return chunk_dir
+
+
+def remove_chunk_dir(chunk_dir):
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(chunk_dir))
+    except OSError:
+        pass
+
+
+def render_chunks(output, no_ruas, nm_ruas, pictures, options, sources, log=print, progress=None, cancel=None,
+                  metrics=None):
+    """Render the pages in chunks of ``options['chunk_pages']`` pages in worker
+    processes and merge them into ``output``.
+
+    Returns the number of errors, like :func:`convert_to_pdf`. Rendering the
+    chunks counts as the ``render`` stage of ``metrics`` and merging them as
+    the ``write`` stage. Finished chunks are kept in :func:`get_chunk_dir`
+    until they are merged, so an interrupted road resumes after its last
+    finished chunk.
+    """
+    metrics = metrics or Metrics()
+
+    chunk_size = options['chunk_pages'] * 6
+    chunks = [pictures[idx:idx + chunk_size] for idx in range(0, len(pictures), chunk_size)]
+    page_count = (len(pictures) + 5) // 6
+    workers = min(options.get('chunk_workers') or os.cpu_count() or 1, len(chunks))
+    log('# Rendering {} pages in {} chunks of {} pages'.format(page_count, len(chunks), options['chunk_pages']))
+
+    chunk_dir = get_chunk_dir(output, pictures, options)
+    chunk_outputs = [os.path.join(chunk_dir, '{:04}.pdf'.format(chunk_idx)) for chunk_idx in range(len(chunks))]
+    finished = [chunk_idx for chunk_idx, chunk_output in enumerate(chunk_outputs) if os.path.exists(chunk_output)]
+    pages_done = sum((len(chunks[chunk_idx]) + 5) // 6 for chunk_idx in finished)
+    if finished:
+        log('# Resuming after {} finished chunk(s)'.format(len(finished)))
+    if progress is not None:
+        progress(pages_done, page_count + 1)
+
+    start = time.perf_counter()
+    # Forked workers would inherit the open temporary files of xhtml2pdf
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_chunk_worker)
+    try:
+        futures = {}
+        for chunk_idx, chunk in enumerate(chunks):
+            if chunk_idx in finished:
+                continue
+            chunk_sources = {path: sources[path] for path in [logo] + [photo.path for photo in chunk]
+                             if path in sources}
+            future = executor.submit(_render_chunk, chunk_outputs[chunk_idx], no_ruas, nm_ruas, chunk, options,
+                                     chunk_sources, chunk_idx * options['chunk_pages'] + 1)
+            futures[future] = chunk_idx
+        pending = set(futures)
+        errors = 0
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            for future in done:
+                chunk_idx = futures[future]
+                first_page = chunk_idx * options['chunk_pages'] + 1
+                last_page = first_page + (len(chunks[chunk_idx]) + 5) // 6 - 1
+                try:
+                    err = future.result()
+                except Exception as e:
+                    raise RuntimeError('pages {}-{}: {}'.format(first_page, last_page, e)) from e
+                if err:
+                    log('# Pages {}-{}: xhtml2pdf reported {} error(s)'.format(first_page, last_page, err))
+                    errors += err
+                pages_done += last_page - first_page + 1
+                if progress is not None:
+                    progress(pages_done, page_count + 1)
+    except BaseException:
+        # Leaving a with block would wait for the queued chunks, the running ones finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    metrics.add('render', time.perf_counter() - start)
+
+    log('# Writing PDF: ' + output)
+    with metrics.stage('write'):
+        merge_pdfs(chunk_outputs, output)
+    remove_chunk_dir(chunk_dir)
+    log('Done!')
+    return errors
+
+
+def render_stream(output, no_ruas, nm_ruas, pictures, options, sources, part_pages, log=print, progress=None,
+                  cancel=None, metrics=None):
+    """Render the pages in parts of ``part_pages`` pages, one after the other,
+    appending every part to ``output`` as soon as it is rendered.
+
+    Only one part is held in memory at a time. Returns the number of errors,
+    like :func:`convert_to_pdf`.
+    """
+    from pdfstream import StreamingPdfWriter
+
+    metrics = metrics or Metrics()
+    part_size = part_pages * 6
+    page_count = (len(pictures) + 5) // 6
+    log('# Rendering {} pages in parts of {} pages: {}'.format(page_count, part_pages, output))
+    if progress is not None:
+        progress(0, page_count + 1)
+
+    tmp_dir = tempfile.mkdtemp(prefix='documentation-')
+    errors = 0
+    try:
+        # A partial PDF has no page tree, it only gets its name once it is complete
+        with atomic_write(output) as tmp_output, open(tmp_output, 'wb') as fp:
+            writer = StreamingPdfWriter(fp)
+            for part_idx, start in enumerate(range(0, len(pictures), part_size)):
+                part = pictures[start:start + part_size]
+                first_page = part_idx * part_pages + 1
+                part_output = os.path.join(tmp_dir, '{:04}.pdf'.format(part_idx))
+
+                def part_progress(value, maximum):
+                    if progress is not None:
+                        progress(first_page - 1 + min(value, (len(part) + 5) // 6), page_count + 1)
+                errors += render_pages(part_output, no_ruas, nm_ruas, part, options, sources, lambda message: None,
+                                       part_progress, cancel, first_page, metrics)
+                with metrics.stage('write'):
+                    writer.append(part_output)
+                os.remove(part_output)
+                # The PDF objects of a part form reference cycles, free them before the next part
+                gc.collect()
+            with metrics.stage('write'):
+                writer.close()
+        log('Done!')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return errors
+
+
+def merge_pdfs(filenames, output):
+    """Concatenate the pages of ``filenames`` into ``output``, see
+    :class:`pdfstream.StreamingPdfWriter`."""
+    from pdfstream import StreamingPdfWriter
+
+    with atomic_write(output) as tmp_output, open(tmp_output, 'wb') as fp:
+        writer = StreamingPdfWriter(fp)
+        for filename in filenames:
+            writer.append(filename)
+        writer.close()
+
+
+@contextmanager
+def atomic_write(output):
+    """Yield a temporary file name next to ``output`` and rename the file to
+    ``output`` when the block finishes, so an interrupted write never leaves
+    a partial PDF under the final name."""
+    directory, basename = os.path.split(output)
+    tmp_output = os.path.join(directory, '.{}.{}.part'.format(basename, uuid.uuid4().hex[:8]))
+    try:
+        yield tmp_output
+        os.replace(tmp_output, output)
+    except BaseException:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+
+
+def link_callback(uri, rel):
+    """Resolve the file:/// URLs of the document to local paths."""
+    if not uri.startswith('file:///'):
+        return uri
+    path = uri[len('file:///'):]
+    if os.name != 'nt':
+        path = '/' + path.lstrip('/')
+    return path
+
+
+def preload():
+    """Import the PDF stack, which is otherwise loaded on the first render."""
+    from xhtml2pdf import pisa  # noqa: F401
+    import canvas_renderer  # noqa: F401
+    import pisasession  # noqa: F401
+
+
+def convert_to_pdf(content, output, log=print, metrics=None, page_style=None, link_callback=link_callback):
+    """Render ``content`` to ``output``, counting the time of xhtml2pdf as the
+    ``render`` stage of ``metrics`` and the time of writing as ``write``.
+
+    With the ``page_style`` of ``content``, the stylesheet parsed for earlier
+    documents is reused, see :mod:`pisasession`. The time of preparing the
+    stylesheet and the page templates is counted as the ``setup`` stage.
+    ``link_callback`` resolves the URLs of the images.
+    """
+    from xhtml2pdf import pisa
+
+    metrics = metrics or Metrics()
+    log('# Writing PDF: ' + output)
+    with atomic_write(output) as tmp_output, open(tmp_output, 'wb') as fp, metrics.stage('render'):
+        if page_style is None:
+            err = pisa.CreatePDF(content, dest=TimedWriter(fp, metrics), link_callback=link_callback).err
+        else:
+            import pisasession
+
+            err = pisasession.create_pdf(content, TimedWriter(fp, metrics), page_style, document_style,
+                                         link_callback, metrics)
+
+    log('Done!')
+    return err
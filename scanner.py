@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Single pass scan of the photos of a road folder."""
+
+import os
+import re
+from collections import namedtuple
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SIDES = ('KIRI', 'KANAN')
+
+# ``sta`` and ``side`` are parsed from the file and folder names, ``size`` and
+# ``mtime_ns`` come from the directory entry so the manifest needs no stat.
+# ``digest`` is the content hash when it is already known, see :mod:`catalog`.
+Photo = namedtuple('Photo', ['path', 'sta', 'side', 'size', 'mtime_ns', 'digest'], defaults=(None,))
+
+
+def parse_sta(basename, dirname):
+    """Return ``(sta, side)`` of a photo, e.g. ``('0+100', 'KIRI')``.
+
+    A ``KIRI`` or ``KANAN`` folder takes precedence over the side written in
+    the file name.
+    """
+    sta = ''
+    side = ''
+    m_sta = re.match(r'STA ([\d+]+) *(KIRI|KANAN)*.*', basename)
+    if m_sta:
+        sta = m_sta.group(1) or ''
+        side = m_sta.group(2) or ''
+    dirname = dirname.upper()
+    if dirname in SIDES:
+        side = dirname
+    return sta, side
+
+
+def parse_chainage(sta):
+    """Return the chainage of a station in meters, e.g. 10000 for ``'10+000'``,
+    or None if it cannot be read."""
+    parts = sta.split('+')
+    if not 1 <= len(parts) <= 2 or not all(part.isdigit() for part in parts):
+        return None
+    if len(parts) == 1:
+        return int(parts[0])
+    return int(parts[0]) * 1000 + int(parts[1])
+
+
+def sort_key(photo):
+    """Order photos by chainage, then by file name. Photos without a
+    readable station come last."""
+    chainage = parse_chainage(photo.sta)
+    return chainage is None, chainage or 0, os.path.basename(photo.path), photo.path
+
+
+def is_photo(name):
+    return name.startswith('STA ') and os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS
+
+
+def walk(directory):
+    """Yield the photo entries below ``directory``, skipping hidden folders."""
+    with os.scandir(directory) as entries:
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.name.startswith('.'):
+                    subdirs.append(entry.path)
+            elif is_photo(entry.name):
+                yield entry
+    for subdir in subdirs:
+        yield from walk(subdir)
+
+
+def scan_road(src_dir):
+    """Return the :class:`Photo` records of a road folder, sorted by chainage.
+
+    The folder tree is walked once and photo extensions are matched
+    case-insensitively.
+    """
+    photos = []
+    for entry in walk(src_dir):
+        stat = entry.stat()
+        sta, side = parse_sta(entry.name, os.path.basename(os.path.dirname(entry.path)))
+        photos.append(Photo(entry.path, sta, side, stat.st_size, stat.st_mtime_ns))
+    return sorted(photos, key=sort_key)
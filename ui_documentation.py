@@ -41,15 +41,32 @@ class Ui_Form(object):
         self.gridLayout.addWidget(self.lbl_title, 6, 0, 1, 1)
         self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.chk_incremental = QtWidgets.QCheckBox(Form)
+        self.chk_incremental.setChecked(True)
+        self.chk_incremental.setObjectName("chk_incremental")
+        self.horizontalLayout_2.addWidget(self.chk_incremental)
         spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_2.addItem(spacerItem)
+        self.lbl_logLevel = QtWidgets.QLabel(Form)
+        self.lbl_logLevel.setObjectName("lbl_logLevel")
+        self.horizontalLayout_2.addWidget(self.lbl_logLevel)
+        self.cb_logLevel = QtWidgets.QComboBox(Form)
+        self.cb_logLevel.setObjectName("cb_logLevel")
+        self.horizontalLayout_2.addWidget(self.cb_logLevel)
         self.btn_clearLog = QtWidgets.QPushButton(Form)
         self.btn_clearLog.setObjectName("btn_clearLog")
         self.horizontalLayout_2.addWidget(self.btn_clearLog)
         self.btn_start = QtWidgets.QPushButton(Form)
         self.btn_start.setObjectName("btn_start")
         self.horizontalLayout_2.addWidget(self.btn_start)
-        self.gridLayout.addLayout(self.horizontalLayout_2, 12, 0, 1, 3)
+        self.btn_resume = QtWidgets.QPushButton(Form)
+        self.btn_resume.setObjectName("btn_resume")
+        self.horizontalLayout_2.addWidget(self.btn_resume)
+        self.btn_cancel = QtWidgets.QPushButton(Form)
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.setObjectName("btn_cancel")
+        self.horizontalLayout_2.addWidget(self.btn_cancel)
+        self.gridLayout.addLayout(self.horizontalLayout_2, 14, 0, 1, 3)
         self.gb_margins = QtWidgets.QGroupBox(Form)
         self.gb_margins.setObjectName("gb_margins")
         self.gridLayout_2 = QtWidgets.QGridLayout(self.gb_margins)
@@ -95,10 +112,85 @@ class Ui_Form(object):
         self.le_title = QtWidgets.QLineEdit(Form)
         self.le_title.setObjectName("le_title")
         self.gridLayout.addWidget(self.le_title, 6, 1, 1, 2)
-        self.te_log = QtWidgets.QPlainTextEdit(Form)
+        self.tab_output = QtWidgets.QTabWidget(Form)
+        self.tab_output.setObjectName("tab_output")
+        self.tab_log = QtWidgets.QWidget()
+        self.tab_log.setObjectName("tab_log")
+        self.verticalLayout = QtWidgets.QVBoxLayout(self.tab_log)
+        self.verticalLayout.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.te_log = QtWidgets.QPlainTextEdit(self.tab_log)
         self.te_log.setReadOnly(True)
         self.te_log.setObjectName("te_log")
-        self.gridLayout.addWidget(self.te_log, 11, 0, 1, 3)
+        self.verticalLayout.addWidget(self.te_log)
+        self.tab_output.addTab(self.tab_log, "")
+        self.tab_preview = QtWidgets.QWidget()
+        self.tab_preview.setObjectName("tab_preview")
+        self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.tab_preview)
+        self.verticalLayout_2.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_2.setObjectName("verticalLayout_2")
+        self.tv_preview = QtWidgets.QTreeView(self.tab_preview)
+        self.tv_preview.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tv_preview.setUniformRowHeights(True)
+        self.tv_preview.setObjectName("tv_preview")
+        self.verticalLayout_2.addWidget(self.tv_preview)
+        self.horizontalLayout_3 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_3.setObjectName("horizontalLayout_3")
+        self.lbl_preview = QtWidgets.QLabel(self.tab_preview)
+        self.lbl_preview.setText("")
+        self.lbl_preview.setObjectName("lbl_preview")
+        self.horizontalLayout_3.addWidget(self.lbl_preview)
+        spacerItem1 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_3.addItem(spacerItem1)
+        self.btn_scan = QtWidgets.QPushButton(self.tab_preview)
+        self.btn_scan.setObjectName("btn_scan")
+        self.horizontalLayout_3.addWidget(self.btn_scan)
+        self.verticalLayout_2.addLayout(self.horizontalLayout_3)
+        self.tab_output.addTab(self.tab_preview, "")
+        self.tab_draft = QtWidgets.QWidget()
+        self.tab_draft.setObjectName("tab_draft")
+        self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.tab_draft)
+        self.verticalLayout_3.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_3.setObjectName("verticalLayout_3")
+        self.sa_draft = QtWidgets.QScrollArea(self.tab_draft)
+        self.sa_draft.setWidgetResizable(True)
+        self.sa_draft.setAlignment(QtCore.Qt.AlignCenter)
+        self.sa_draft.setObjectName("sa_draft")
+        self.sa_draftContents = QtWidgets.QWidget()
+        self.sa_draftContents.setObjectName("sa_draftContents")
+        self.verticalLayout_4 = QtWidgets.QVBoxLayout(self.sa_draftContents)
+        self.verticalLayout_4.setObjectName("verticalLayout_4")
+        self.lbl_draftImage = QtWidgets.QLabel(self.sa_draftContents)
+        self.lbl_draftImage.setText("")
+        self.lbl_draftImage.setAlignment(QtCore.Qt.AlignCenter)
+        self.lbl_draftImage.setObjectName("lbl_draftImage")
+        self.verticalLayout_4.addWidget(self.lbl_draftImage)
+        self.sa_draft.setWidget(self.sa_draftContents)
+        self.verticalLayout_3.addWidget(self.sa_draft)
+        self.horizontalLayout_4 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_4.setObjectName("horizontalLayout_4")
+        self.cb_draftRoad = QtWidgets.QComboBox(self.tab_draft)
+        self.cb_draftRoad.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToContents)
+        self.cb_draftRoad.setObjectName("cb_draftRoad")
+        self.horizontalLayout_4.addWidget(self.cb_draftRoad)
+        self.sb_draftPages = QtWidgets.QSpinBox(self.tab_draft)
+        self.sb_draftPages.setMinimum(1)
+        self.sb_draftPages.setMaximum(20)
+        self.sb_draftPages.setProperty("value", 2)
+        self.sb_draftPages.setObjectName("sb_draftPages")
+        self.horizontalLayout_4.addWidget(self.sb_draftPages)
+        self.lbl_draft = QtWidgets.QLabel(self.tab_draft)
+        self.lbl_draft.setText("")
+        self.lbl_draft.setObjectName("lbl_draft")
+        self.horizontalLayout_4.addWidget(self.lbl_draft)
+        spacerItem2 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_4.addItem(spacerItem2)
+        self.btn_draft = QtWidgets.QPushButton(self.tab_draft)
+        self.btn_draft.setObjectName("btn_draft")
+        self.horizontalLayout_4.addWidget(self.btn_draft)
+        self.verticalLayout_3.addLayout(self.horizontalLayout_4)
+        self.tab_output.addTab(self.tab_draft, "")
+        self.gridLayout.addWidget(self.tab_output, 11, 0, 1, 3)
         self.gb_paperSize = QtWidgets.QGroupBox(Form)
         self.gb_paperSize.setObjectName("gb_paperSize")
         self.gridLayout_3 = QtWidgets.QGridLayout(self.gb_paperSize)
@@ -134,8 +226,8 @@ class Ui_Form(object):
         self.le_supervisor = QtWidgets.QLineEdit(Form)
         self.le_supervisor.setObjectName("le_supervisor")
         self.gridLayout.addWidget(self.le_supervisor, 10, 1, 1, 2)
-        spacerItem1 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.gridLayout.addItem(spacerItem1, 13, 1, 1, 1)
+        spacerItem3 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.gridLayout.addItem(spacerItem3, 15, 1, 1, 1)
         self.le_output = QtWidgets.QLineEdit(Form)
         self.le_output.setObjectName("le_output")
         self.gridLayout.addWidget(self.le_output, 1, 1, 1, 1)
@@ -146,13 +238,70 @@ class Ui_Form(object):
         self.label_9.setStyleSheet("color: #444")
         self.label_9.setObjectName("label_9")
         self.gridLayout.addWidget(self.label_9, 9, 1, 1, 2)
+        self.lbl_workers = QtWidgets.QLabel(Form)
+        self.lbl_workers.setObjectName("lbl_workers")
+        self.gridLayout.addWidget(self.lbl_workers, 5, 0, 1, 1)
+        self.hl_process = QtWidgets.QHBoxLayout()
+        self.hl_process.setObjectName("hl_process")
+        self.sb_workers = QtWidgets.QSpinBox(Form)
+        self.sb_workers.setMinimum(1)
+        self.sb_workers.setObjectName("sb_workers")
+        self.hl_process.addWidget(self.sb_workers)
+        self.lbl_engine = QtWidgets.QLabel(Form)
+        self.lbl_engine.setObjectName("lbl_engine")
+        self.hl_process.addWidget(self.lbl_engine)
+        self.cb_engine = QtWidgets.QComboBox(Form)
+        self.cb_engine.setObjectName("cb_engine")
+        self.hl_process.addWidget(self.cb_engine)
+        self.lbl_chunkPages = QtWidgets.QLabel(Form)
+        self.lbl_chunkPages.setObjectName("lbl_chunkPages")
+        self.hl_process.addWidget(self.lbl_chunkPages)
+        self.sb_chunkPages = QtWidgets.QSpinBox(Form)
+        self.sb_chunkPages.setMaximum(1000)
+        self.sb_chunkPages.setSingleStep(10)
+        self.sb_chunkPages.setObjectName("sb_chunkPages")
+        self.hl_process.addWidget(self.sb_chunkPages)
+        self.lbl_memoryLimit = QtWidgets.QLabel(Form)
+        self.lbl_memoryLimit.setObjectName("lbl_memoryLimit")
+        self.hl_process.addWidget(self.lbl_memoryLimit)
+        self.sb_memoryLimit = QtWidgets.QSpinBox(Form)
+        self.sb_memoryLimit.setMaximum(65536)
+        self.sb_memoryLimit.setSingleStep(256)
+        self.sb_memoryLimit.setObjectName("sb_memoryLimit")
+        self.hl_process.addWidget(self.sb_memoryLimit)
+        self.gridLayout.addLayout(self.hl_process, 5, 1, 1, 2)
+        self.lbl_roadProgress = QtWidgets.QLabel(Form)
+        self.lbl_roadProgress.setObjectName("lbl_roadProgress")
+        self.gridLayout.addWidget(self.lbl_roadProgress, 12, 0, 1, 1)
+        self.pb_road = QtWidgets.QProgressBar(Form)
+        self.pb_road.setProperty("value", 0)
+        self.pb_road.setObjectName("pb_road")
+        self.gridLayout.addWidget(self.pb_road, 12, 1, 1, 2)
+        self.lbl_overallProgress = QtWidgets.QLabel(Form)
+        self.lbl_overallProgress.setObjectName("lbl_overallProgress")
+        self.gridLayout.addWidget(self.lbl_overallProgress, 13, 0, 1, 1)
+        self.pb_overall = QtWidgets.QProgressBar(Form)
+        self.pb_overall.setProperty("value", 0)
+        self.pb_overall.setObjectName("pb_overall")
+        self.gridLayout.addWidget(self.pb_overall, 13, 1, 1, 2)
+        self.lbl_dpi = QtWidgets.QLabel(Form)
+        self.lbl_dpi.setObjectName("lbl_dpi")
+        self.gridLayout.addWidget(self.lbl_dpi, 2, 0, 1, 1)
+        self.sb_dpi = QtWidgets.QSpinBox(Form)
+        self.sb_dpi.setMaximum(1200)
+        self.sb_dpi.setSingleStep(50)
+        self.sb_dpi.setProperty("value", 150)
+        self.sb_dpi.setObjectName("sb_dpi")
+        self.gridLayout.addWidget(self.sb_dpi, 2, 1, 1, 2)
 
         self.retranslateUi(Form)
+        self.tab_output.setCurrentIndex(0)
         QtCore.QMetaObject.connectSlotsByName(Form)
         Form.setTabOrder(self.le_source, self.btn_source)
         Form.setTabOrder(self.btn_source, self.le_output)
         Form.setTabOrder(self.le_output, self.btn_output)
-        Form.setTabOrder(self.btn_output, self.cb_paperSize)
+        Form.setTabOrder(self.btn_output, self.sb_dpi)
+        Form.setTabOrder(self.sb_dpi, self.cb_paperSize)
         Form.setTabOrder(self.cb_paperSize, self.cb_paperOrientation)
         Form.setTabOrder(self.cb_paperOrientation, self.le_paperWidth)
         Form.setTabOrder(self.le_paperWidth, self.le_paperHeight)
@@ -160,13 +309,28 @@ class Ui_Form(object):
         Form.setTabOrder(self.le_mTop, self.le_mBottom)
         Form.setTabOrder(self.le_mBottom, self.le_mLeft)
         Form.setTabOrder(self.le_mLeft, self.le_mRight)
-        Form.setTabOrder(self.le_mRight, self.le_title)
+        Form.setTabOrder(self.le_mRight, self.sb_workers)
+        Form.setTabOrder(self.sb_workers, self.cb_engine)
+        Form.setTabOrder(self.cb_engine, self.sb_chunkPages)
+        Form.setTabOrder(self.sb_chunkPages, self.sb_memoryLimit)
+        Form.setTabOrder(self.sb_memoryLimit, self.le_title)
         Form.setTabOrder(self.le_title, self.le_no_dist)
         Form.setTabOrder(self.le_no_dist, self.le_no_lembar)
         Form.setTabOrder(self.le_no_lembar, self.le_supervisor)
-        Form.setTabOrder(self.le_supervisor, self.te_log)
-        Form.setTabOrder(self.te_log, self.btn_start)
-        Form.setTabOrder(self.btn_start, self.btn_clearLog)
+        Form.setTabOrder(self.le_supervisor, self.tab_output)
+        Form.setTabOrder(self.tab_output, self.te_log)
+        Form.setTabOrder(self.te_log, self.tv_preview)
+        Form.setTabOrder(self.tv_preview, self.btn_scan)
+        Form.setTabOrder(self.btn_scan, self.sa_draft)
+        Form.setTabOrder(self.sa_draft, self.cb_draftRoad)
+        Form.setTabOrder(self.cb_draftRoad, self.sb_draftPages)
+        Form.setTabOrder(self.sb_draftPages, self.btn_draft)
+        Form.setTabOrder(self.btn_draft, self.chk_incremental)
+        Form.setTabOrder(self.chk_incremental, self.cb_logLevel)
+        Form.setTabOrder(self.cb_logLevel, self.btn_start)
+        Form.setTabOrder(self.btn_start, self.btn_resume)
+        Form.setTabOrder(self.btn_resume, self.btn_cancel)
+        Form.setTabOrder(self.btn_cancel, self.btn_clearLog)
 
     def retranslateUi(self, Form):
         _translate = QtCore.QCoreApplication.translate
@@ -176,8 +340,15 @@ class Ui_Form(object):
         self.btn_output.setText(_translate("Form", "..."))
         self.lbl_no_dist.setText(_translate("Form", "No Distribusi"))
         self.lbl_title.setText(_translate("Form", "Title"))
+        self.chk_incremental.setToolTip(_translate("Form", "Skip roads whose photos and settings have not changed since their PDF was written"))
+        self.chk_incremental.setText(_translate("Form", "Skip unchanged roads"))
+        self.lbl_logLevel.setText(_translate("Form", "Log level"))
+        self.cb_logLevel.setToolTip(_translate("Form", "Messages below this level are not shown nor written to documentation.log"))
         self.btn_clearLog.setText(_translate("Form", "Clear Log"))
         self.btn_start.setText(_translate("Form", "Start"))
+        self.btn_resume.setToolTip(_translate("Form", "Continue the interrupted batch of the output directory after its last finished road"))
+        self.btn_resume.setText(_translate("Form", "Resume"))
+        self.btn_cancel.setText(_translate("Form", "Cancel"))
         self.gb_margins.setTitle(_translate("Form", "Margins (cm)"))
         self.lbl_mTop.setText(_translate("Form", "Top"))
         self.lbl_mBottom.setText(_translate("Form", "Bottom"))
@@ -186,6 +357,16 @@ class Ui_Form(object):
         self.btn_source.setText(_translate("Form", "..."))
         self.le_no_lembar.setInputMask(_translate("Form", ">99 \\0\\0\\0 XX A \\0\\0\\0 9;X"))
         self.label.setText(_translate("Form", "Source"))
+        self.tab_output.setTabText(self.tab_output.indexOf(self.tab_log), _translate("Form", "Log"))
+        self.btn_scan.setToolTip(_translate("Form", "Scan the source directory and list the photos of every road in render order"))
+        self.btn_scan.setText(_translate("Form", "Scan"))
+        self.tab_output.setTabText(self.tab_output.indexOf(self.tab_preview), _translate("Form", "Preview"))
+        self.cb_draftRoad.setToolTip(_translate("Form", "Road of the draft"))
+        self.sb_draftPages.setToolTip(_translate("Form", "Number of pages of the draft, counted from the first page"))
+        self.sb_draftPages.setSuffix(_translate("Form", " pages"))
+        self.btn_draft.setToolTip(_translate("Form", "Draw the first pages of the road with low resolution photos, redrawn when the settings change. The draft follows the layout of the Native engine, the HTML engine may place the photos and captions slightly differently"))
+        self.btn_draft.setText(_translate("Form", "Draft"))
+        self.tab_output.setTabText(self.tab_output.indexOf(self.tab_draft), _translate("Form", "Draft"))
         self.gb_paperSize.setTitle(_translate("Form", "Paper Size"))
         self.label_5.setText(_translate("Form", "Size"))
         self.label_4.setText(_translate("Form", "Height (cm)"))
@@ -194,3 +375,19 @@ class Ui_Form(object):
         self.label_7.setText(_translate("Form", "Supervisor"))
         self.label_9.setText(_translate(
             "Form", "000 akan diisi nomor ruas dan nomor halaman secara otomatis. Contoh: 15 000 -- K 000 1"))
+        self.lbl_workers.setText(_translate("Form", "Workers"))
+        self.sb_workers.setToolTip(_translate("Form", "Number of road folders rendered in parallel"))
+        self.lbl_engine.setText(_translate("Form", "Engine"))
+        self.cb_engine.setToolTip(_translate("Form", "Native draws the pages directly with reportlab and is faster than HTML"))
+        self.lbl_chunkPages.setText(_translate("Form", "Pages per chunk"))
+        self.sb_chunkPages.setToolTip(_translate("Form", "Split roads with more pages into chunks rendered in parallel and merged"))
+        self.sb_chunkPages.setSpecialValueText(_translate("Form", "Off"))
+        self.lbl_memoryLimit.setText(_translate("Form", "Memory limit"))
+        self.sb_memoryLimit.setToolTip(_translate("Form", "Render roads that would need more memory in parts, one after the other. Approximate, per road being rendered"))
+        self.sb_memoryLimit.setSpecialValueText(_translate("Form", "Off"))
+        self.sb_memoryLimit.setSuffix(_translate("Form", " MB"))
+        self.lbl_roadProgress.setText(_translate("Form", "Road"))
+        self.lbl_overallProgress.setText(_translate("Form", "Overall"))
+        self.lbl_dpi.setText(_translate("Form", "Photo DPI"))
+        self.sb_dpi.setToolTip(_translate("Form", "Resolution photos are resampled to before they are embedded"))
+        self.sb_dpi.setSpecialValueText(_translate("Form", "Original"))
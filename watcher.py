@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Watch the source folder and render roads as their photos arrive.
+
+    python cli.py SOURCE OUTPUT --watch --debounce 10
+
+Changes of ``STA *`` photos are noticed with inotify on Linux and by
+rescanning the road folders every few seconds elsewhere. A road is rendered
+once no photo of it has changed for ``debounce`` seconds, so a burst of
+uploads gives a single render. Every render runs in a short-lived child
+process, which keeps the memory of the watching process flat however long
+it runs.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import struct
+import sys
+import time
+
+import batch
+import renderer
+import scanner
+
+DEFAULT_DEBOUNCE = 10.0
+DEFAULT_POLL_INTERVAL = 5.0
+# A road that keeps changing is still rendered after this many debounce periods
+MAX_DELAY_FACTOR = 6
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+ALL_ROADS = None
+
+
+def road_of(src_dir, path):
+    """Return the road folder name that ``path`` belongs to, or None."""
+    relative = os.path.relpath(path, src_dir)
+    if relative.startswith(os.pardir) or relative == os.curdir:
+        return None
+    return relative.split(os.sep, 1)[0]
+
+
+class PollingWatcher:
+    """Notices changed roads by comparing a signature of their photos.
+
+    Only one signature per road is kept, so the memory does not grow with
+    the number of photos.
+    """
+
+    def __init__(self, src_dir, interval=DEFAULT_POLL_INTERVAL):
+        self.src_dir = src_dir
+        self.interval = interval
+        self.signatures = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        signatures = {}
+        for road in batch.list_roads(self.src_dir):
+            if renderer.parse_road(road) is None:
+                continue
+            try:
+                photos = scanner.scan_road(road)
+            except OSError:
+                continue
+            signatures[os.path.basename(road)] = hash(tuple((photo.path, photo.size, photo.mtime_ns)
+                                                            for photo in photos))
+        return signatures
+
+    def changes(self, timeout):
+        """Wait up to ``timeout`` seconds and return the names of the changed roads."""
+        delay = self.next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(delay, 0))
+        self.next_scan = time.monotonic() + self.interval
+        signatures = self.scan()
+        changed = {road for road, signature in signatures.items() if self.signatures.get(road) != signature}
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Notices changed roads with Linux inotify, watching every folder of the tree."""
+
+    def __init__(self, src_dir):
+        self.src_dir = src_dir
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}
+        self.add_tree(src_dir)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOSPC:
+                raise OSError(code, 'Too many folders to watch, raise fs.inotify.max_user_watches')
+            # The folder was removed again in the meantime
+            return
+        self.paths[wd] = path
+
+    def add_tree(self, directory):
+        self.add_watch(directory)
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = [entry.path for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+        except OSError:
+            return
+        for subdir in subdirs:
+            self.add_tree(subdir)
+
+    def changes(self, timeout):
+        """Wait up to ``timeout`` seconds and return the names of the changed roads,
+        or :data:`ALL_ROADS` if events were lost.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return ALL_ROADS
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR:
+                if name.startswith('.'):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+            elif not (mask & IN_DELETE_SELF) and not scanner.is_photo(name):
+                continue
+            road = road_of(self.src_dir, path)
+            if road is not None:
+                changed.add(road)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(src_dir, polling=False, interval=DEFAULT_POLL_INTERVAL, log=print):
+    """Return an inotify watcher on Linux, a polling watcher otherwise or when
+    ``polling`` is set, e.g. for network shares whose changes inotify misses.
+    """
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(src_dir)
+        except (OSError, AttributeError) as e:
+            log('# inotify is not available ({}), polling every {} s'.format(e, interval))
+    return PollingWatcher(src_dir, interval)
+
+
+def _init_render():
+    # Ctrl+C reaches the whole process group, let the watcher cancel the render
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _log_stderr(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _render_roads(src_dir, output_dir, options, roads, workers, quiet, cancel, result_queue, metrics_file):
+    _init_render()
+    log = (lambda message: None) if quiet else _log_stderr
+    results = batch.run_batch(src_dir, output_dir, options, workers=workers, log=log, cancel=cancel,
+                              incremental=True, metrics_file=metrics_file, roads=roads)
+    result_queue.put(results)
+
+
+def watch(src_dir, output_dir, options, workers=1, log=print, cancel=None,
+          debounce=DEFAULT_DEBOUNCE, polling=False, poll_interval=DEFAULT_POLL_INTERVAL,
+          metrics_file=None, quiet=False, on_results=None):
+    """Render the changed roads of ``src_dir`` until ``cancel`` is set.
+
+    All roads are brought up to date first, unchanged roads are skipped
+    through the build manifest. ``on_results(results)`` is called with the
+    :class:`batch.RoadResult` list of every render.
+    """
+    context = multiprocessing.get_context()
+    watcher = create_watcher(src_dir, polling, poll_interval, log)
+    log('# Watching "{}" ({})'.format(src_dir, type(watcher).__name__))
+
+    pending = {}  # road -> (first change, last change)
+    running = None
+    result_queue = context.Queue()
+    render_cancel = context.Event()
+
+    def start(roads):
+        process = context.Process(target=_render_roads,
+                                  args=(src_dir, output_dir, options, roads, workers, quiet,
+                                        render_cancel, result_queue, metrics_file))
+        process.start()
+        return process
+
+    def finish(process):
+        try:
+            results = result_queue.get(timeout=1)
+        except queue.Empty:
+            log('# Render process exited with status {}'.format(process.exitcode))
+            return
+        if on_results is not None:
+            on_results(results)
+
+    try:
+        running = start(None)
+        while True:
+            if cancel is not None and cancel.is_set():
+                break
+
+            changed = watcher.changes(0.5)
+            if changed is ALL_ROADS:
+                log('# Events were lost, checking all roads')
+                changed = {os.path.basename(road) for road in batch.list_roads(src_dir)}
+            now = time.monotonic()
+            for road in changed:
+                first, _ = pending.get(road, (now, now))
+                pending[road] = (first, now)
+
+            if running is not None:
+                if not running.is_alive() or not result_queue.empty():
+                    finish(running)
+                    running.join()
+                    running = None
+                continue
+
+            due = [road for road, (first, last) in pending.items()
+                   if now - last >= debounce or now - first >= debounce * MAX_DELAY_FACTOR]
+            for road in due:
+                del pending[road]
+            due = sorted(road for road in due if renderer.parse_road(os.path.join(src_dir, road)) is not None
+                         and os.path.isdir(os.path.join(src_dir, road)))
+            if due:
+                log('# Changed: ' + ', '.join(due))
+                running = start(due)
+    finally:
+        if running is not None:
+            render_cancel.set()
+            while running.is_alive() and result_queue.empty():
+                running.join(0.2)
+            if not result_queue.empty():
+                finish(running)
+            running.join()
+        watcher.close()
+    log('# Stopped watching')
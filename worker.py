@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+
+import renderer
+from batch import list_roads, run_batch
+
+
+class BatchWorker(QObject):
+    """Runs :func:`batch.run_batch` on a ``QThread`` and reports through signals."""
+
+    log = pyqtSignal(str)
+    road_progress = pyqtSignal(str, int, int)
+    overall_progress = pyqtSignal(int, int)
+    finished = pyqtSignal(list)
+
+    def __init__(self, src_dir, output_dir, options, workers=1, incremental=False, metrics_file=None, resume=False):
+        super(BatchWorker, self).__init__()
+        self.src_dir = src_dir
+        self.output_dir = output_dir
+        self.options = options
+        self.workers = workers
+        self.incremental = incremental
+        self.metrics_file = metrics_file
+        self.resume = resume
+        self._cancel = threading.Event()
+
+    def run(self):
+        results = []
+        try:
+            results = run_batch(self.src_dir, self.output_dir, self.options,
+                                workers=self.workers,
+                                log=self.log.emit,
+                                progress=self.road_progress.emit,
+                                overall_progress=self.overall_progress.emit,
+                                cancel=self._cancel,
+                                incremental=self.incremental,
+                                metrics_file=self.metrics_file,
+                                resume=self.resume)
+        except Exception as e:
+            self.log.emit('# Error: ' + str(e))
+        self.finished.emit(results)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+
+class ScanWorker(QObject):
+    """Scans the photos of every road folder on a ``QThread`` for the preview."""
+
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, src_dir):
+        super(ScanWorker, self).__init__()
+        self.src_dir = src_dir
+
+    def run(self):
+        roads = []
+        try:
+            for road in sorted(list_roads(self.src_dir), key=os.path.basename):
+                if renderer.parse_road(road) is not None:
+                    roads.append((road, renderer.find_pictures(road)))
+        except Exception as e:
+            # An exception leaving a slot aborts the application
+            self.error.emit(str(e))
+        finally:
+            self.finished.emit(roads)
+
+
+class DraftWorker(QObject):
+    """Draws the draft of the first pages of a road on a ``QThread``."""
+
+    finished = pyqtSignal(QImage, float)
+    error = pyqtSignal(str)
+
+    def __init__(self, src_dir, options, pages):
+        super(DraftWorker, self).__init__()
+        self.src_dir = src_dir
+        self.options = options
+        self.pages = pages
+
+    def run(self):
+        # Loads the native engine, which is not needed before the first draft or render
+        import draft
+
+        image = QImage()
+        start = time.perf_counter()
+        try:
+            image = draft.render_draft(self.src_dir, self.options, self.pages)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            self.finished.emit(image, time.perf_counter() - start)